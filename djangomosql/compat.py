@@ -7,3 +7,15 @@ try:
     get_model = apps.get_model
 except ImportError:
     from django.db.models.loading import get_model  # noqa
+
+# Polyfill for import_string, which replaced import_by_path in Django 1.7.
+try:
+    from django.utils.module_loading import import_string
+except ImportError:
+    from django.utils.module_loading import import_by_path as import_string  # noqa
+
+# setting_changed was moved into django.core.signals in Django 1.8.
+try:
+    from django.core.signals import setting_changed
+except ImportError:
+    from django.test.signals import setting_changed  # noqa
@@ -0,0 +1,6 @@
+#!/usr/bin/env python
+# -*- coding: utf-8
+
+# Install the dispatchers into mosql.util before any submodule imports names
+# from it.
+from . import patch  # noqa
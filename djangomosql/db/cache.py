@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+# -*- coding: utf-8
+
+from __future__ import unicode_literals
+import collections
+import threading
+
+from django.conf import settings
+from ..compat import setting_changed
+
+
+class QueryCache(object):
+    """A thread-safe LRU cache for compiled queries
+
+    Keys are fingerprints generated by :func:`make_fingerprint`. Hits and
+    misses are counted and can be inspected with :meth:`stats`.
+    """
+    def __init__(self, maxsize):
+        """Initialize a :class:`QueryCache` object.
+
+        :param maxsize: Maximum number of queries to keep.
+        :type maxsize: `int`
+        """
+        super(QueryCache, self).__init__()
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return '<QueryCache: {size}/{maxsize}>'.format(
+            size=len(self._data), maxsize=self.maxsize
+        )
+
+    def get(self, key):
+        """Gets the cached value for ``key``, or `None` if it is not cached"""
+        with self._lock:
+            try:
+                value = self._data.pop(key)
+            except KeyError:
+                self.misses += 1
+                return None
+            self._data[key] = value     # Mark as most recently used.
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        """Caches ``value`` for ``key``, evicting the least recently used"""
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = value
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        """Removes all cached values and resets the statistics"""
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        """Gets statistics of the cache
+
+        :returns: A `dict` with keys ``hits``, ``misses``, ``size`` and
+            ``maxsize``.
+        """
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+            }
+
+
+def make_fingerprint(obj):
+    """Converts a query parameter structure into a hashable fingerprint
+
+    Types are kept in the fingerprint since they affect the generated SQL,
+    e.g. ``raw('a')`` and ``'a'``, or ``True`` and ``1``. Objects providing
+    a ``_get_fingerprint()`` method, e.g. querysets used as subqueries, are
+    fingerprinted by its return value instead of themselves, so that equal
+    objects share the fingerprint, and are not kept alive by it.
+
+    :raises: `TypeError` if ``obj`` contains an unhashable value.
+    """
+    if isinstance(obj, dict):
+        return (dict, tuple(
+            (make_fingerprint(k), make_fingerprint(v))
+            for k, v in obj.items()
+        ))
+    elif isinstance(obj, (list, tuple)):
+        return (type(obj), tuple(make_fingerprint(v) for v in obj))
+    get_fingerprint = getattr(obj, '_get_fingerprint', None)
+    if get_fingerprint is not None:
+        return (type(obj), get_fingerprint())
+    hash(obj)
+    return (type(obj), obj)
+
+
+_query_cache = None
+
+
+def get_query_cache():
+    """Gets the process-wide :class:`QueryCache`
+
+    The cache is configured by the ``MOSQL_QUERY_CACHE_SIZE`` setting. It is
+    disabled by default, in which case `None` is returned.
+    """
+    global _query_cache
+    if _query_cache is None:
+        maxsize = getattr(settings, 'MOSQL_QUERY_CACHE_SIZE', 0)
+        if not maxsize:
+            return None
+        _query_cache = QueryCache(maxsize)
+    return _query_cache
+
+
+def _reset_query_cache(setting, **kwargs):
+    global _query_cache
+    if setting in ('MOSQL_QUERY_CACHE_SIZE', 'MOSQL_ENGINE_HANDLERS'):
+        _query_cache = None
+
+
+setting_changed.connect(_reset_query_cache)
@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+# -*- coding: utf-8
+
+from __future__ import unicode_literals
+import threading
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections
+from ..compat import setting_changed
+
+try:
+    from concurrent import futures
+except ImportError:     # Python 2 without the "futures" backport
+    futures = None
+
+
+class QueryFuture(object):
+    """The pending result of a query executed asynchronously
+
+    This wraps a :class:`concurrent.futures.Future`. It can be awaited in a
+    coroutine, or waited for synchronously with :meth:`result`.
+    """
+    def __init__(self, future):
+        super(QueryFuture, self).__init__()
+        self.future = future
+
+    def __repr__(self):
+        return '<QueryFuture: {future!r}>'.format(future=self.future)
+
+    def __await__(self):
+        import asyncio
+        return asyncio.wrap_future(self.future).__await__()
+
+    def done(self):
+        return self.future.done()
+
+    def cancel(self):
+        return self.future.cancel()
+
+    def result(self, timeout=None):
+        return self.future.result(timeout)
+
+    def exception(self, timeout=None):
+        return self.future.exception(timeout)
+
+    def add_done_callback(self, fn):
+        self.future.add_done_callback(lambda future: fn(self))
+
+
+class QueryIterator(QueryFuture):
+    """The pending result of a query selecting a list of items
+
+    In addition to being awaited for the list, this can be iterated with
+    ``async for``. All items are fetched at once, so iterating does not need
+    further round-trips to the executor.
+    """
+    def __init__(self, future):
+        super(QueryIterator, self).__init__(future)
+        self._items = None
+
+    def __aiter__(self):
+        return self
+
+    def __anext__(self):
+        import asyncio
+        loop = asyncio.get_event_loop()
+        result = loop.create_future()
+
+        def set_next():
+            try:
+                result.set_result(next(self._items))
+            except StopIteration:
+                result.set_exception(StopAsyncIteration())  # noqa: F821
+
+        def on_done(future):
+            if future.cancelled():
+                result.cancel()
+            elif future.exception() is not None:
+                result.set_exception(future.exception())
+            else:
+                self._items = iter(future.result())
+                set_next()
+
+        if self._items is None:
+            asyncio.wrap_future(self.future).add_done_callback(on_done)
+        else:
+            set_next()
+        return result
+
+
+def completed(value):
+    """Creates a :class:`QueryFuture` already resolved to ``value``"""
+    future = _get_futures().Future()
+    future.set_result(value)
+    return QueryFuture(future)
+
+
+def _get_futures():
+    if futures is None:
+        raise ImproperlyConfigured(
+            'Asynchronous queries require concurrent.futures. Install the '
+            '"futures" package on Python 2.'
+        )
+    return futures
+
+
+_executors = {}
+_executors_lock = threading.Lock()
+
+
+def get_executor(alias):
+    """Gets the thread pool executing asynchronous queries on a database
+
+    Each database alias has its own pool, so slow queries on one database
+    do not block others. The size of each pool is configured by the
+    ``MOSQL_ASYNC_WORKERS`` setting (4 by default). Threads in the pool keep
+    their own connections to the database, which are reused between queries.
+    """
+    with _executors_lock:
+        try:
+            return _executors[alias]
+        except KeyError:
+            pass
+        max_workers = getattr(settings, 'MOSQL_ASYNC_WORKERS', 4)
+        executor = _get_futures().ThreadPoolExecutor(max_workers=max_workers)
+        _executors[alias] = executor
+        return executor
+
+
+def _run(alias, fn, args, kwargs):
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        # Connections of pool threads are never closed by request signals.
+        connections[alias].close_if_unusable_or_obsolete()
+
+
+def submit(alias, fn, *args, **kwargs):
+    """Executes ``fn`` in the thread pool of a database
+
+    :returns: A :class:`QueryFuture` resolving to the result of ``fn``.
+    """
+    future = get_executor(alias).submit(_run, alias, fn, args, kwargs)
+    return QueryFuture(future)
+
+
+def _reset_executors(setting, **kwargs):
+    if setting in ('DATABASES', 'MOSQL_ASYNC_WORKERS'):
+        with _executors_lock:
+            executors = list(_executors.values())
+            _executors.clear()
+        for executor in executors:
+            executor.shutdown(wait=False)
+
+
+setting_changed.connect(_reset_executors)
@@ -2,16 +2,89 @@
 # -*- coding: utf-8
 
 from __future__ import unicode_literals
+import collections
+import csv
+import itertools
+import json
 import logging
-from django.db import connections
-from django.db.models.query import RawQuerySet
+import sqlite3
+import threading
+import uuid
+from django.conf import settings
+from django.db import DatabaseError, connections
 from django.db.utils import DEFAULT_DB_ALIAS
-from mosql.util import raw, paren, identifier
-from .patch import patch_map, Patcher
+from django.utils import six
+from mosql.query import delete, insert, select
+from mosql.util import (
+    raw, paren, identifier, value, concat_by_comma, or_
+)
+from ..compat import import_string, setting_changed
+from ..signals import executing
+from ..utils import CSVStream, decode_csv_row, encode_csv_row
+from . import executors
+from .patch import (
+    collect_params, format_placeholders, patch_map, Patcher
+)
 
 
 logger = logging.getLogger(__name__)
 
+slow_query_logger = logging.getLogger('djangomosql.slow_queries')
+
+_outstanding = collections.defaultdict(int)
+_outstanding_lock = threading.Lock()
+
+
+class track_query(object):
+    """Context manager to count a query in progress on a database
+
+    The counts are used to balance reads between replicas by
+    :class:`djangomosql.routers.ReplicaRouter`.
+    """
+    def __init__(self, alias):
+        self.alias = alias
+
+    def __enter__(self):
+        with _outstanding_lock:
+            _outstanding[self.alias] += 1
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        with _outstanding_lock:
+            _outstanding[self.alias] -= 1
+
+
+class _execution(executing):
+    """Context manager around executing a query with an engine handler
+
+    The query is tracked as outstanding, instrumentation signals are sent,
+    and the query is checked against the slow query threshold afterwards.
+    """
+    def __init__(self, handler, sql, params=None, model=None):
+        super(_execution, self).__init__(
+            handler.alias, handler.name, sql, params, model
+        )
+        self.handler = handler
+        self._tracker = track_query(handler.alias)
+
+    def __enter__(self):
+        self._tracker.__enter__()
+        return super(_execution, self).__enter__()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        try:
+            super(_execution, self).__exit__(exc_type, exc_val, exc_tb)
+        finally:
+            self._tracker.__exit__(exc_type, exc_val, exc_tb)
+        if exc_type is None:
+            self.handler.check_slow_query(
+                self.sql, self.params, self.execute_time
+            )
+
+
+def get_outstanding_queries(alias):
+    """Gets the number of queries in progress on a database"""
+    return _outstanding.get(alias, 0)
+
 
 class EngineHandler(object):
     """A base implementation for database engine handlers.
@@ -23,12 +96,31 @@ class EngineHandler(object):
     databases require different syntaxes, this class provides an implementation
     that conforms to the SQL stadard.
     """
+    #: Whether row value comparisons, e.g. ``(a, b) > (1, 2)``, should be used
+    #: for keyset pagination.
+    row_value_comparison = True
+
+    #: File formats supported by :meth:`copy_to` and :meth:`copy_from`.
+    copy_formats = ('csv',)
+
+    #: Formats of execution plans supported by :meth:`explain`.
+    explain_formats = ('text', 'json')
+
     def __init__(self, connection, vendor):
         super(EngineHandler, self).__init__()
-        self.connection = connection
+        self.alias = connection.alias
         self.name = vendor
         self.patch_dict = patch_map.get(vendor, {})
 
+    @property
+    def connection(self):
+        """The connection to the database of this handler
+
+        Django's connections are thread-local, so the connection is looked up
+        on each access. This allows the handler to be shared between threads.
+        """
+        return connections[self.alias]
+
     def __repr__(self):
         return '<EngineHandler: {name}>'.format(name=self.name)
 
@@ -40,7 +132,7 @@ class EngineHandler(object):
             with handler.patch():
                 # MoSQL queries here will be patched
         """
-        return Patcher(self.patch_dict)
+        return Patcher(self.patch_dict, self.name)
 
     def no_limit_value(self):
         """Gets the ``no_limit_value`` for the backend
@@ -56,6 +148,301 @@ class EngineHandler(object):
         """
         return self.connection.cursor()
 
+    def chunked_cursor(self):
+        """Gets a cursor that streams results from the database
+
+        Used by :meth:`djangomosql.models.MoQuerySet.iterator`. This
+        implementation returns a normal cursor, which is suitable for backends
+        that fetch rows from the database lazily.
+        """
+        return self.cursor()
+
+    def executing(self, sql, params=None, model=None):
+        """Gets a context manager to wrap the execution of a query
+
+        Usage::
+
+            with handler.executing(sql, params) as execution:
+                cursor.execute(sql, params)
+                execution.row_count = cursor.rowcount
+
+        The query is counted as outstanding, instrumentation signals in
+        :mod:`djangomosql.signals` are sent, and :meth:`check_slow_query` is
+        called after the query is executed.
+
+        :param model: The model queried, sent with the signals.
+        """
+        return _execution(self, sql, params, model)
+
+    def execute(self, sql, params=None, model=None):
+        """Executes a raw SQL on the current connection
+
+        :param model: The model queried, sent with the instrumentation
+            signals in :mod:`djangomosql.signals`.
+        :returns: The cursor the query is executed on.
+        """
+        cursor = self.cursor()
+        with self.executing(sql, params, model) as execution:
+            cursor.execute(sql, params)
+            execution.row_count = cursor.rowcount
+        return cursor
+
+    def get_explain_query(self, sql, analyze=False, format='text'):
+        """Generates a query to get the execution plan of a query
+
+        This implementation prefixes the query with ``EXPLAIN``, or
+        ``EXPLAIN ANALYZE``. The format is handled by :meth:`parse_plan`.
+        """
+        explain = 'EXPLAIN ANALYZE' if analyze else 'EXPLAIN'
+        return '{explain} {sql}'.format(explain=explain, sql=sql)
+
+    def parse_plan(self, columns, rows, format='text'):
+        """Converts rows returned by an explain query into a plan
+
+        This implementation returns a list of dicts mapping column names to
+        values for the ``'json'`` format. The text format contains a line
+        for each row, with tab-separated values, and column names as the
+        first line if there are more than one column.
+        """
+        if format == 'json':
+            return [dict(zip(columns, row)) for row in rows]
+        lines = [
+            '\t'.join('' if v is None else six.text_type(v) for v in row)
+            for row in rows
+        ]
+        if len(columns) > 1:
+            lines.insert(0, '\t'.join(columns))
+        return '\n'.join(lines)
+
+    def explain(self, sql, params=None, analyze=False, format='text'):
+        """Gets the execution plan of a query from the database
+
+        Used by :meth:`djangomosql.models.MoQuerySet.explain`.
+
+        :param analyze: If true, the query is executed to include actual
+            timings in the plan, if supported by the database. Do not analyze
+            queries with side effects.
+        :param format: ``'text'`` for the plan as the database displays it,
+            or ``'json'`` for a structured plan of lists and dicts.
+        :returns: A string for the text format, or a list for JSON.
+        """
+        if format not in self.explain_formats:
+            raise ValueError(
+                'Cannot explain in {format} format with {name}'.format(
+                    format=format, name=self.name
+                )
+            )
+        query = self.get_explain_query(sql, analyze, format)
+        # Not instrumented, since this is used to inspect slow queries.
+        cursor = self.cursor()
+        try:
+            cursor.execute(query, params)
+            columns = [d[0] for d in cursor.description]
+            rows = cursor.fetchall()
+        finally:
+            cursor.close()
+        return self.parse_plan(columns, rows, format)
+
+    def check_slow_query(self, sql, params, execute_time):
+        """Logs a query if its execution is slow
+
+        A query is slow if it takes at least ``MOSQL_SLOW_QUERY_SECONDS``
+        seconds to execute. Slow queries are logged to the
+        ``djangomosql.slow_queries`` logger at the ``WARNING`` level, with
+        ``sql``, ``params``, ``duration`` and ``plan`` as extra attributes.
+        Plans of ``SELECT`` queries are captured with :meth:`explain`, without
+        analyzing (executing) the query again.
+        """
+        threshold = getattr(settings, 'MOSQL_SLOW_QUERY_SECONDS', None)
+        if threshold is None or execute_time < threshold:
+            return
+        plan = None
+        if sql.lstrip()[:6].upper() == 'SELECT':
+            try:
+                plan = self.explain(sql, params)
+            except DatabaseError:
+                logger.debug('Failed to explain slow query', exc_info=True)
+        slow_query_logger.warning(
+            'Slow query (%.3f s) on %s: %s\n%s',
+            execute_time, self.alias, sql, plan or '',
+            extra={
+                'alias': self.alias, 'sql': sql, 'params': params,
+                'duration': execute_time, 'plan': plan,
+            },
+        )
+
+    def submit(self, fn, *args, **kwargs):
+        """Executes ``fn`` asynchronously
+
+        Used by asynchronous methods of :class:`djangomosql.models.MoQuerySet`
+        and :class:`djangomosql.models.MoManager`. This implementation runs
+        ``fn`` in a thread pool dedicated to the database. Subclasses can
+        override this to use a native asynchronous driver.
+
+        :returns: A :class:`djangomosql.db.executors.QueryFuture` resolving to
+            the result of ``fn``.
+        """
+        return executors.submit(self.alias, fn, *args, **kwargs)
+
+    def get_count_query(self, queryset):
+        """Generates a ``SELECT COUNT(*)`` query for the queryset
+
+        The query of the queryset is wrapped as a derived table, so that
+        clauses affecting the number of rows, e.g. ``GROUP BY``, ``JOIN``,
+        ``LIMIT`` and ``OFFSET``, are all honoured by the database. Ordering is
+        dropped unless it is needed to determine which rows are sliced.
+        """
+        params = queryset._params
+        if not params.offset and params.limit is None:
+            queryset = queryset._clone()
+            queryset._params = params._replace(order_by=())
+        with self.patch():
+            table = raw('{query} AS {alias}'.format(
+                query=paren(queryset.query), alias=identifier('sub')
+            ))
+            return select(table, select=raw('COUNT(*)'))
+
+    def get_exists_query(self, queryset):
+        """Generates a query selecting at most one row if the queryset selects
+           any
+
+        This implementation selects a constant from the query of the queryset
+        with ``LIMIT 1``. Ordering is dropped unless it is needed to determine
+        which rows are sliced.
+        """
+        params = queryset._params
+        queryset = queryset[:1]
+        if not params.offset and params.limit is None:
+            queryset._params = queryset._params._replace(order_by=())
+        return queryset._get_select_query([raw('1')])
+
+    def get_batch_size(self, fields, rows):
+        """Gets the maximum number of rows inserted by a single query
+
+        Simply calls ``connection.ops.bulk_batch_size``, which accounts for
+        limits on the number of parameters of the backend.
+
+        :param fields: Model fields to be inserted.
+        :param rows: Rows to be inserted.
+        """
+        return max(self.connection.ops.bulk_batch_size(fields, rows), 1)
+
+    def get_insert_query(self, table, columns, rows, on_conflict=None,
+                         conflict_columns=(), update_columns=()):
+        """Generates a multi-row ``INSERT`` query
+
+        Conflicts are handled with an ``ON CONFLICT`` clause, which is
+        supported by PostgreSQL (9.5 or later) and SQLite (3.24 or later).
+
+        :param rows: A sequence of rows, each a sequence of values for each
+            column.
+        :param on_conflict: `None` to fail on conflicts, ``'ignore'`` to skip
+            conflicting rows, or ``'update'`` to update existing rows with
+            ``update_columns`` of the inserted rows.
+        :param conflict_columns: Columns of the unique constraint to check for
+            conflicts. Required when ``on_conflict`` is ``'update'``.
+        :param update_columns: Columns to update on conflicts.
+        """
+        with self.patch():
+            query = insert(table, columns=columns, values=rows)
+            if on_conflict is None:
+                return query
+            target = ''
+            if conflict_columns:
+                target = ' ' + paren(concat_by_comma(
+                    identifier(c) for c in conflict_columns
+                ))
+            if on_conflict == 'ignore':
+                action = 'DO NOTHING'
+            elif not conflict_columns:
+                raise ValueError(
+                    'conflict_fields are required to update on conflicts'
+                )
+            else:
+                action = 'DO UPDATE SET ' + concat_by_comma(
+                    '{column} = EXCLUDED.{column}'.format(
+                        column=identifier(c)
+                    ) for c in update_columns
+                )
+            return '{query} ON CONFLICT{target} {action}'.format(
+                query=query, target=target, action=action
+            )
+
+    def copy_to(self, queryset, fileobj, format='csv'):
+        """Writes rows selected by a queryset into a file
+
+        This implementation streams rows with :meth:`chunked_cursor`, and
+        writes them as CSV with :mod:`csv`.
+
+        :returns: The number of rows written.
+        """
+        self._check_copy_format(format)
+        sql, params = queryset._get_select_query(parameterize=True)
+        writer = csv.writer(fileobj)
+        count = 0
+        cursor = self.chunked_cursor()
+        try:
+            cursor.execute(sql, params)
+            while True:
+                rows = cursor.fetchmany(2000)
+                if not rows:
+                    break
+                writer.writerows(encode_csv_row(row) for row in rows)
+                count += len(rows)
+        finally:
+            cursor.close()
+        return count
+
+    def copy_from(self, table, source, columns, format='csv'):
+        """Loads rows into a table
+
+        This implementation reads rows lazily, and inserts them in batches
+        with multi-row ``INSERT`` queries. Empty CSV values are inserted as
+        ``NULL``.
+
+        :param source: A file-like object containing CSV, or an iterable of
+            rows, each a sequence of values for each column.
+        :param columns: Columns of the table to load values into.
+        :returns: The number of rows loaded.
+        """
+        self._check_copy_format(format)
+        if hasattr(source, 'read'):
+            rows = (decode_csv_row(row) for row in csv.reader(source))
+        else:
+            rows = iter(source)
+        size = self.get_batch_size(columns, range(2000))
+        count = 0
+        while True:
+            batch = list(itertools.islice(rows, size))
+            if not batch:
+                break
+            with collect_params() as params:
+                sql = self.get_insert_query(table, columns, batch)
+            cursor = self.execute(format_placeholders(sql), params)
+            cursor.close()
+            count += len(batch)
+        return count
+
+    def _check_copy_format(self, format):
+        if format not in self.copy_formats:
+            raise ValueError(
+                'Cannot copy in {format} format with {name}'.format(
+                    format=format, name=self.name
+                )
+            )
+
+    def get_batch_delete_query(self, table, column, pks):
+        """Generates a ``DELETE`` query for a batch of primary keys
+
+        Used by :meth:`djangomosql.models.MoQuerySet.delete` when deleting in
+        batches.
+
+        :param column: The primary key column.
+        :param pks: Primary keys of rows in the batch.
+        """
+        with self.patch():
+            return delete(table, where={column: pks})
+
     def get_where_for_delete(self, queryset):
         """Generates a mapping to be used as the ``where`` parameter for a
            ``DELETE`` query
@@ -69,12 +456,54 @@ class EngineHandler(object):
         value = raw(paren(queryset._get_select_query([pkcol])))
         return {key: value}
 
+    def get_where_for_update(self, queryset):
+        """Generates a mapping to be used as the ``where`` parameter for an
+           ``UPDATE`` query
+
+        Used when ``mosql.query.update`` is called. Rows are selected the same
+        way as in ``DELETE`` queries, so this implementation simply calls
+        :meth:`get_where_for_delete`.
+        """
+        return self.get_where_for_delete(queryset)
+
+    def get_keyset_condition(self, ordering, values):
+        """Generates a condition selecting rows after a row in an ordering
+
+        Used for keyset pagination. If all columns are ordered in the same
+        direction and :attr:`row_value_comparison` is set, a row value
+        comparison is generated, e.g. ``("a", "b") > (1, 2)``. Otherwise the
+        condition is expanded into ``"a" > 1 OR ("a" = 1 AND "b" > 2)``.
+
+        :param ordering: A sequence of 2-tuples ``(column, descending)``.
+        :param values: Values of each column in the last seen row.
+        :rtype: str
+        """
+        columns = [column for column, _ in ordering]
+        directions = set(descending for _, descending in ordering)
+        if len(columns) == 1:
+            return '{column} {op} {value}'.format(
+                column=identifier(columns[0]),
+                op='<' if directions.pop() else '>', value=value(values[0])
+            )
+        elif self.row_value_comparison and len(directions) == 1:
+            return '{columns} {op} {values}'.format(
+                columns=paren(concat_by_comma(identifier(columns))),
+                op='<' if directions.pop() else '>',
+                values=paren(concat_by_comma(value(values)))
+            )
+        conditions = []
+        for i, (column, descending) in enumerate(ordering):
+            condition = [((c, '='), v) for c, v in zip(columns[:i], values)]
+            condition.append(((column, '<' if descending else '>'), values[i]))
+            conditions.append(condition)
+        return paren(or_(conditions))
+
     def get_star(self, queryset):
         """Generates a ``<table_name>.*`` representation
 
         :rtype: :class:`mosql.util.raw`
         """
-        table = queryset._params['alias'] or queryset.model._meta.db_table
+        table = queryset._params.alias or queryset.model._meta.db_table
         return [raw('{table}.*'.format(table=identifier(table)))]
 
     def get_aggregated_columns_for_group_by(self, queryset, aggregate):
@@ -89,7 +518,7 @@ class EngineHandler(object):
         :type aggregate: str
         :returns: A sequence of fully qualified ``SELECT`` identifiers.
         """
-        table = queryset._params['alias'] or queryset.model._meta.db_table
+        table = queryset._params.alias or queryset.model._meta.db_table
         return [
             raw('{func}({table}.{field}) AS {field}'.format(
                 func=aggregate, table=identifier(table),
@@ -101,34 +530,192 @@ class EngineHandler(object):
 class postgresql(EngineHandler):
     """PostgreSQL Handler
 
-    Basically a no-op class since PostgreSQL conforms to the SQL standard for
-    the most part.
+    PostgreSQL conforms to the SQL standard for the most part, so this class
+    only provides PostgreSQL-specific optimizations.
     """
-    pass
+    copy_formats = ('csv', 'binary')
+
+    def chunked_cursor(self):
+        """Re-implemented from :class:`EngineHandler`
+
+        psycopg2 fetches the whole result into memory with a normal cursor.
+        This implementation returns a named (server-side) cursor instead, so
+        that rows are transferred only when fetched. The cursor is created
+        ``WITH HOLD`` in autocommit mode so that it outlives the implicit
+        transaction.
+        """
+        self.connection.ensure_connection()
+        name = 'djangomosql_{id}'.format(id=uuid.uuid4().hex)
+        return self.connection.connection.cursor(
+            name=name, withhold=self.connection.get_autocommit()
+        )
+
+    def copy_to(self, queryset, fileobj, format='csv'):
+        """Re-implemented from :class:`EngineHandler`
+
+        This implementation wraps the query with ``COPY (...) TO STDOUT``, so
+        that PostgreSQL streams rows into the file directly. Both ``'csv'``
+        and ``'binary'`` formats are supported; the file needs to be opened in
+        binary mode for the latter. The query is compiled with inlined values
+        since ``COPY`` does not accept parameters.
+        """
+        self._check_copy_format(format)
+        sql = 'COPY {query} TO STDOUT WITH (FORMAT {format})'.format(
+            query=paren(queryset._get_select_query()),
+            format=format,
+        )
+        cursor = self.cursor()
+        try:
+            cursor.copy_expert(sql, fileobj)
+            return cursor.rowcount
+        finally:
+            cursor.close()
+
+    def copy_from(self, table, source, columns, format='csv'):
+        """Re-implemented from :class:`EngineHandler`
+
+        This implementation loads rows with ``COPY ... FROM STDIN``. An
+        iterable of rows is rendered into CSV lazily as PostgreSQL reads it.
+        """
+        self._check_copy_format(format)
+        if not hasattr(source, 'read'):
+            if format != 'csv':
+                raise ValueError('Only files can be copied in binary format')
+            source = CSVStream(source)
+        with self.patch():
+            sql = 'COPY {table} {columns} FROM STDIN WITH (FORMAT {format})'
+            sql = sql.format(
+                table=identifier(table),
+                columns=paren(concat_by_comma(identifier(c) for c in columns)),
+                format=format,
+            )
+        cursor = self.cursor()
+        try:
+            cursor.copy_expert(sql, source)
+            return cursor.rowcount
+        finally:
+            cursor.close()
+
+    def get_batch_size(self, fields, rows):
+        """Re-implemented from :class:`EngineHandler`
+
+        PostgreSQL accepts at most 65535 parameters in a query.
+        """
+        size = super(postgresql, self).get_batch_size(fields, rows)
+        return max(min(size, 65535 // max(len(fields), 1)), 1)
+
+    def get_explain_query(self, sql, analyze=False, format='text'):
+        """Re-implemented from :class:`EngineHandler`
+
+        This implementation uses ``EXPLAIN (FORMAT ...)`` so that PostgreSQL
+        produces JSON plans itself.
+        """
+        options = ['FORMAT {format}'.format(format=format.upper())]
+        if analyze:
+            options.insert(0, 'ANALYZE')
+        return 'EXPLAIN ({options}) {sql}'.format(
+            options=', '.join(options), sql=sql
+        )
+
+    def parse_plan(self, columns, rows, format='text'):
+        """Re-implemented from :class:`EngineHandler`
+
+        The JSON plan is returned as decoded from the single row.
+        """
+        if format == 'json':
+            plan = rows[0][0]
+            if isinstance(plan, six.string_types):
+                plan = json.loads(plan)
+            return plan
+        return '\n'.join(row[0] for row in rows)
 
 
 class mysql(EngineHandler):
     """MySQL Handler"""
+
+    # MySQL does not use indexes for row value comparisons reliably.
+    row_value_comparison = False
+
+    def chunked_cursor(self):
+        """Re-implemented from :class:`EngineHandler`
+
+        MySQLdb buffers the whole result with a normal cursor. This
+        implementation returns an unbuffered ``SSCursor`` instead.
+        """
+        from MySQLdb.cursors import SSCursor
+        self.connection.ensure_connection()
+        return self.connection.connection.cursor(SSCursor)
+
+    def get_insert_query(self, table, columns, rows, on_conflict=None,
+                         conflict_columns=(), update_columns=()):
+        """Re-implemented from :class:`EngineHandler`
+
+        MySQL uses ``INSERT IGNORE`` and ``ON DUPLICATE KEY UPDATE`` instead,
+        which check all unique keys. ``conflict_columns`` is ignored.
+        """
+        with self.patch():
+            if on_conflict == 'update':
+                return insert(
+                    table, columns=columns, values=rows,
+                    on_duplicate_key_update=[
+                        (c, raw('VALUES({c})'.format(c=identifier(c))))
+                        for c in update_columns
+                    ]
+                )
+            query = insert(table, columns=columns, values=rows)
+            if on_conflict == 'ignore':
+                query = query.replace('INSERT INTO', 'INSERT IGNORE INTO', 1)
+            return query
+
     def get_where_for_delete(self, queryset):
         """Re-implemented from :class:`EngineHandler`
 
         MySQL does not support ``SELECT`` subqueries on the taget table inside
-        a ``DELETE`` query. Ths implementation performs an extra ``SELECT`` to
-        get a list of primary keys so that the ``DELETE`` query can be formed
-        correctly.
+        ``DELETE`` and ``UPDATE`` queries. This implementation wraps the
+        subquery inside a derived table, which MySQL materializes before
+        modifying the table, so that the primary keys need not be fetched into
+        Python. It is also used by :meth:`get_where_for_update`.
         """
-        pkname, pkcol = queryset.model._meta.pk.get_attname_column()
+        pkcol = queryset.model._meta.pk.get_attname_column()[1]
         key = '{pkcol} IN'.format(pkcol=pkcol)
-        subqueryset = RawQuerySet(
-            raw_query=queryset._get_select_query([pkcol]),
-            model=queryset.model, using=queryset._db
-        )
-        value = [getattr(obj, pkname) for obj in subqueryset]
+        subquery = raw('{query} AS {alias}'.format(
+            query=paren(queryset._get_select_query([pkcol])),
+            alias=identifier('sub'),
+        ))
+        value = raw(paren(select(subquery, select=(pkcol,))))
         return {key: value}
 
+    def get_explain_query(self, sql, analyze=False, format='text'):
+        """Re-implemented from :class:`EngineHandler`
+
+        JSON plans are produced with ``EXPLAIN FORMAT=JSON``. ``EXPLAIN
+        ANALYZE`` is only supported since MySQL 8.0.18, and only in the
+        text (tree) format.
+        """
+        if analyze:
+            if format == 'json':
+                raise ValueError('MySQL cannot analyze queries in JSON format')
+            return 'EXPLAIN ANALYZE {sql}'.format(sql=sql)
+        if format == 'json':
+            return 'EXPLAIN FORMAT=JSON {sql}'.format(sql=sql)
+        return 'EXPLAIN {sql}'.format(sql=sql)
+
+    def parse_plan(self, columns, rows, format='text'):
+        """Re-implemented from :class:`EngineHandler`
+
+        The JSON plan is decoded from the single row.
+        """
+        if format == 'json':
+            return json.loads(rows[0][0])
+        return super(mysql, self).parse_plan(columns, rows, format)
+
 
 class sqlite(EngineHandler):
     """SQLite Handler"""
+
+    # Row values are only supported since SQLite 3.15.
+    row_value_comparison = False
+
     def get_aggregated_columns_for_group_by(self, queryset, aggregate):
         """Re-implemented from :class:`EngineHandler`
 
@@ -138,29 +725,143 @@ class sqlite(EngineHandler):
         # Aggregation does not work with GROUP BY for SQLite. Give up lamely.
         return self.get_star(queryset)
 
+    def get_insert_query(self, table, columns, rows, on_conflict=None,
+                         conflict_columns=(), update_columns=()):
+        """Re-implemented from :class:`EngineHandler`
+
+        Conflicting rows are ignored with ``INSERT OR IGNORE``. ``ON CONFLICT``
+        is only supported since SQLite 3.24; older versions replace
+        conflicting rows with ``INSERT OR REPLACE`` instead, which resets
+        columns not inserted to their defaults.
+        """
+        if on_conflict == 'ignore':
+            prefix = 'INSERT OR IGNORE INTO'
+        elif on_conflict == 'update' and sqlite3.sqlite_version_info < (3, 24):
+            prefix = 'INSERT OR REPLACE INTO'
+        else:
+            return super(sqlite, self).get_insert_query(
+                table, columns, rows, on_conflict,
+                conflict_columns, update_columns
+            )
+        with self.patch():
+            query = insert(table, columns=columns, values=rows)
+        return query.replace('INSERT INTO', prefix, 1)
+
+    def get_explain_query(self, sql, analyze=False, format='text'):
+        """Re-implemented from :class:`EngineHandler`
+
+        SQLite describes plans with ``EXPLAIN QUERY PLAN``, and cannot
+        analyze queries.
+        """
+        if analyze:
+            raise ValueError('SQLite cannot analyze queries')
+        return 'EXPLAIN QUERY PLAN {sql}'.format(sql=sql)
+
+    def parse_plan(self, columns, rows, format='text'):
+        """Re-implemented from :class:`EngineHandler`
+
+        Since SQLite 3.24, rows of a plan form a tree by their ``id`` and
+        ``parent`` columns. The JSON plan is a list of nodes, each a dict
+        containing ``id``, ``detail`` and ``children``. The text plan shows
+        each node on a line, indented under its parent. Plans of older
+        versions are handled by :class:`EngineHandler`.
+        """
+        if 'parent' not in columns:
+            return super(sqlite, self).parse_plan(columns, rows, format)
+        nodes = {}
+        roots = []
+        for row in rows:
+            row = dict(zip(columns, row))
+            node = {'id': row['id'], 'detail': row['detail'], 'children': []}
+            nodes[node['id']] = node
+            parent = nodes.get(row['parent'])
+            (roots if parent is None else parent['children']).append(node)
+        if format == 'json':
+            return roots
+
+        lines = []
+
+        def render(nodes, depth):
+            for node in nodes:
+                lines.append('  ' * depth + node['detail'])
+                render(node['children'], depth + 1)
+
+        render(roots, 0)
+        return '\n'.join(lines)
+
+
+#: Handler classes of each database vendor.
+handler_classes = {
+    'postgresql': postgresql,
+    'mysql': mysql,
+    'sqlite': sqlite,
+}
+
+# Cached handler instances of each database alias.
+_handlers = {}
+
+
+def register_handler(vendor, handler_class):
+    """Registers an :class:`EngineHandler` subclass for a database vendor
+
+    Handlers can also be registered with the ``MOSQL_ENGINE_HANDLERS``
+    setting, a mapping of vendor names to dotted paths of handler classes.
+    Handlers registered by the setting take precedence.
+
+    :param vendor: The vendor name, as in Django's ``connection.vendor``.
+    :param handler_class: An :class:`EngineHandler` subclass.
+    """
+    handler_classes[vendor] = handler_class
+    _handlers.clear()
+
+
+def get_handler_class(vendor):
+    """Gets the :class:`EngineHandler` subclass for a database vendor"""
+    paths = getattr(settings, 'MOSQL_ENGINE_HANDLERS', {})
+    if vendor in paths:
+        return import_string(paths[vendor])
+    handler_class = handler_classes.get(vendor)
+    if handler_class is None:   # pragma: no cover
+        msg = (
+            'Current database ({vendor}) not supported by MoSQL. '
+            'Will generate standard SQL instead.'
+        ).format(vendor=vendor)
+        logger.warning(msg)
+        handler_class = EngineHandler
+    return handler_class
+
 
 def get_engine_handler(database=None):
-    """Initialize an :class:`EngineHandler`-subclass instance of correct type
+    """Get an :class:`EngineHandler`-subclass instance of correct type
 
     This function inspects the settings in your Django project to determine
     the correct handler type, instantiates an instance of that type, and
-    returns it.
+    returns it. Instances are cached for each database, and the cache is
+    cleared when the ``DATABASES`` or ``MOSQL_ENGINE_HANDLERS`` setting
+    changes.
 
     :param database: Name of the database. This should be one of the top-level
         keys in your ``DATABASES`` setting. Can be obtained from a model
         instance by its ``_db`` attribute.
     """
+    database = database or DEFAULT_DB_ALIAS
+    try:
+        return _handlers[database]
+    except KeyError:
+        pass
     try:
-        connection = connections[database or DEFAULT_DB_ALIAS]
+        connection = connections[database]
     except KeyError:            # pragma: no cover
         connection = connections[DEFAULT_DB_ALIAS]
     vendor = connection.vendor
-    handler_class = globals().get(vendor)
-    if handler_class is None:   # pragma: no cover
-        msg = (
-            'Current database ({vendor}) not supported by MoSQL. '
-            'Will generate standard SQL instead.'
-        ).format(vendor=vendor)
-        logger.warning(msg)
-        handler_class = EngineHandler
-    return handler_class(connection, vendor)
+    handler = get_handler_class(vendor)(connection, vendor)
+    _handlers[database] = handler
+    return handler
+
+
+def _clear_handlers(setting, **kwargs):
+    if setting in ('DATABASES', 'MOSQL_ENGINE_HANDLERS'):
+        _handlers.clear()
+
+
+setting_changed.connect(_clear_handlers)
@@ -1,8 +1,15 @@
 #!/usr/bin/env python
 # -*- coding: utf-8
 
+import threading
+
 from mosql import util
 
+try:
+    from contextvars import ContextVar
+except ImportError:     # Python < 3.7
+    ContextVar = None
+
 # Backup things in util
 backup = {k: getattr(util, k) for k in dir(util)}
 
@@ -15,28 +22,180 @@ for k in backup:
     setattr(util, k, backup[k])
 
 
+class _ContextLocal(object):
+    """Stores a value for each execution context
+
+    A ContextVar is used if available, so that values are also isolated
+    between asyncio tasks. Otherwise the value is stored per thread.
+    """
+    def __init__(self, name):
+        if ContextVar is not None:
+            self._var = ContextVar(name, default=None)
+        else:
+            self._local = threading.local()
+
+    def get(self):
+        if ContextVar is not None:
+            return self._var.get()
+        return getattr(self._local, 'value', None)
+
+    def set(self, value):
+        if ContextVar is not None:
+            self._var.set(value)
+        else:
+            self._local.value = value
+
+
+# The active patches are stored per execution context, so that queries for
+# different databases can be generated concurrently.
+_current_patches = _ContextLocal('djangomosql_patches')
+_current_dialect = _ContextLocal('djangomosql_dialect')
+_current_params = _ContextLocal('djangomosql_params')
+
+
+def get_current_patches():
+    """Gets the patches active in the current context, or `None`"""
+    return _current_patches.get()
+
+
+def get_current_dialect():
+    """Gets the dialect SQL is generated in for the current context
+
+    This is the name of the active :class:`Patcher`, or the patcher itself if
+    it is unnamed. `None` is returned if no patcher is active. Rendered SQL
+    can be memoized by this value.
+    """
+    return _current_dialect.get()
+
+
+def get_current_params():
+    """Gets the list collecting query parameters in the current context
+
+    Returns `None` if parameters are not being collected.
+    """
+    return _current_params.get()
+
+
+def _make_dispatcher(name):
+    default = backup[name]
+
+    def dispatcher(*args, **kwargs):
+        patches = _current_patches.get()
+        func = patches.get(name, default) if patches else default
+        return func(*args, **kwargs)
+
+    dispatcher.__name__ = str(name)
+    dispatcher.__doc__ = default.__doc__
+    return dispatcher
+
+
+#: Members of ``mosql.util`` that can be patched. These are replaced once by
+#: dispatchers that look up the patches active in the current context.
+patchable = frozenset([
+    'escape', 'format_param', 'stringify_bool',
+    'delimit_identifier', 'escape_identifier',
+])
+
+for k in patchable:
+    setattr(util, k, _make_dispatcher(k))
+
+
+#: Placeholder of parameters in SQL generated inside :class:`collect_params`.
+#: It is replaced by ``%s`` with :func:`format_placeholders`, after literal
+#: ``%`` characters in the SQL are escaped.
+placeholder = '\x00param\x00'
+
+
+def format_placeholders(sql):
+    """Formats SQL generated inside :class:`collect_params` for execution
+
+    Literal ``%`` characters, e.g. in raw SQL fragments or identifiers, are
+    escaped as ``%%``, and placeholders are replaced by ``%s``, the format
+    used by Django's cursors.
+    """
+    return sql.replace('%', '%%').replace(placeholder, '%s')
+
+
+@util.qualifier
+def _parameterize(x):
+    if x is None or isinstance(x, (bool, util.param)):
+        return backup['value'](x)
+    _current_params.get().append(x)
+    return placeholder
+
+
+def _value(x):
+    if _current_params.get() is None:
+        return backup['value'](x)
+    return _parameterize(x)
+
+
+_value.__doc__ = backup['value'].__doc__
+util.value = _value
+
+
+class collect_params(object):
+    """Context manager to generate parameterized queries with MoSQL
+
+    Inside the context, values are formatted as :data:`placeholder` instead
+    of being escaped inline. The values are appended to the list returned on
+    entering, in the order they appear in the generated SQL. Values formatted
+    as ``LIMIT`` and ``OFFSET`` are always inlined. The SQL needs to be
+    formatted with :func:`format_placeholders` before it is executed.
+
+    Usage::
+
+        with collect_params() as params:
+            sql = select('person', where={'name': 'Mosky'})
+        cursor.execute(format_placeholders(sql), params)
+    """
+    def __enter__(self):
+        self._previous = _current_params.get()
+        params = []
+        _current_params.set(params)
+        return params
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        _current_params.set(self._previous)
+
+
 class Patcher(object):
     """This class implements the context manager interface for syntax patching.
+
+    Patches are only visible to the current thread (or execution context),
+    so using different patchers concurrently is safe. Patchers can be nested;
+    the previous patches are restored on exit.
     """
-    def __init__(self, patches):
+    def __init__(self, patches, name=None):
         """Initialize a :class:`Patcher` object.
 
         :param patches: a mapping of members to be patched
         :type patches: `dict`
+        :param name: the name of the dialect the patches implement, usually
+            the database vendor
+        :type name: `str`
         """
-        self._backup = {}
+        unknown = set(patches) - patchable
+        if unknown:
+            raise ValueError('Cannot patch {names}'.format(
+                names=', '.join(sorted(unknown))
+            ))
         self._patches = patches
+        self.name = name
+        self._previous = []
 
     def __enter__(self):
-        for k in backup:
-            self._backup[k] = getattr(mosql.util, k)
-            setattr(mosql.util, k, self._patches.get(k, backup[k]))
-        return self._backup
+        self._previous.append(
+            (_current_patches.get(), _current_dialect.get())
+        )
+        _current_patches.set(self._patches)
+        _current_dialect.set(self if self.name is None else self.name)
+        return self._patches
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        while self._backup:
-            k, v = self._backup.popitem()
-            setattr(mosql.util, k, v)
+        patches, dialect = self._previous.pop()
+        _current_patches.set(patches)
+        _current_dialect.set(dialect)
 
 
 patch_map = {
@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+# -*- coding: utf-8
+
+from django.db.models.sql import RawQuery
+from .handlers import get_engine_handler
+
+
+class ChunkedRawQuery(RawQuery):
+    """A raw query that streams its result from the database in chunks
+
+    The cursor is obtained from :meth:`EngineHandler.chunked_cursor`, and rows
+    are fetched by ``fetchmany``, so that at most ``chunk_size`` rows are held
+    in memory at once. The query is executed with
+    :meth:`EngineHandler.executing`, and the cursor is closed once the rows
+    are exhausted, or the iterator is closed.
+    """
+    def __init__(self, sql, using, params=None, chunk_size=2000, model=None):
+        super(ChunkedRawQuery, self).__init__(sql, using, params=params)
+        self.chunk_size = chunk_size
+        self.model = model
+
+    def clone(self, using):
+        return ChunkedRawQuery(
+            self.sql, using, params=self.params, chunk_size=self.chunk_size,
+            model=self.model,
+        )
+
+    def __iter__(self):
+        self._execute_query()
+        cursor = self.cursor
+        try:
+            # Server-side cursors may not know their description until the
+            # first fetch, so the first chunk is fetched eagerly.
+            rows = cursor.fetchmany(self.chunk_size)
+        except Exception:
+            cursor.close()
+            raise
+        return self._iter_chunks(cursor, rows)
+
+    def _iter_chunks(self, cursor, rows):
+        try:
+            while rows:
+                for row in rows:
+                    yield row
+                rows = cursor.fetchmany(self.chunk_size)
+        finally:
+            cursor.close()
+
+    def _execute_query(self):
+        handler = get_engine_handler(self.using)
+        cursor = handler.chunked_cursor()
+        try:
+            with handler.executing(self.sql, self.params, self.model):
+                cursor.execute(self.sql, self.params)
+        except Exception:
+            cursor.close()
+            raise
+        self.cursor = cursor
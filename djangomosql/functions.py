@@ -3,20 +3,102 @@
 
 __all__ = ['Avg', 'Count', 'Min', 'Max', 'Stddev', 'Sum', 'Variance']
 
+from django.utils import six
+from django.utils.encoding import python_2_unicode_compatible
 from mosql import func as _
 from mosql.util import raw
-from .utils import LazyString
+from .db.patch import get_current_dialect
 
 
-class LazyValueGenerator(LazyString):
+@python_2_unicode_compatible
+class LazyValueGenerator(object):
+    """A SQL function call
 
-    __class__ = raw
+    This is converted into :class:`mosql.util.raw` when a query is compiled.
+    Arguments are qualified as identifiers in the dialect of the database, so
+    the SQL is generated lazily, and memoized for each dialect.
+
+    It can be used wherever a :class:`mosql.util.raw` is accepted by
+    :class:`djangomosql.models.MoQuerySet`. Concatenating it with a string,
+    e.g. ``Min('price') + ' DESC'``, results in another lazy expression.
+    Other string methods are called on the SQL in the current dialect.
+    """
+    function = None
 
     def __init__(self, *args, **kwargs):
-        super(LazyValueGenerator, self).__init__(
-            lambda: self.function(*args, **kwargs)
+        super(LazyValueGenerator, self).__init__()
+        self.args = args
+        self.kwargs = kwargs
+        self._rendered = {}
+
+    def __repr__(self):
+        return '<{name}: {sql}>'.format(
+            name=self.__class__.__name__, sql=self.resolve()
+        )
+
+    def __str__(self):
+        return six.text_type(self.resolve())
+
+    def _key(self):
+        return (self.__class__, self.args, tuple(sorted(self.kwargs.items())))
+
+    def __eq__(self, other):
+        return (
+            isinstance(other, LazyValueGenerator)
+            and self._key() == other._key()
         )
 
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self._key())
+
+    def __add__(self, other):
+        return _Concatenation(self, other)
+
+    def __radd__(self, other):
+        return _Concatenation(other, self)
+
+    def __getattr__(self, key):
+        if key.startswith('_'):
+            raise AttributeError(key)
+        return getattr(self.resolve(), key)
+
+    def resolve(self):
+        """Generates the SQL for the dialect in the current context.
+
+        :rtype: :class:`mosql.util.raw`
+        """
+        dialect = get_current_dialect()
+        try:
+            return self._rendered[dialect]
+        except KeyError:
+            sql = self.function(*self.args, **self.kwargs)
+            self._rendered[dialect] = sql
+            return sql
+
+
+def resolve(value):
+    """Converts SQL functions in a value into :class:`mosql.util.raw`
+
+    Values in tuples, e.g. a column and its alias, are converted as well.
+    Other values are returned unchanged.
+    """
+    if isinstance(value, LazyValueGenerator):
+        return value.resolve()
+    elif isinstance(value, tuple):
+        return tuple(resolve(v) for v in value)
+    return value
+
+
+def _concatenate(*parts):
+    return raw(''.join(six.text_type(resolve(p)) for p in parts))
+
+
+class _Concatenation(LazyValueGenerator):
+    function = staticmethod(_concatenate)
+
 
 class Avg(LazyValueGenerator):
     function = staticmethod(_.avg)
@@ -2,23 +2,216 @@
 # -*- coding: utf-8 -*-
 
 from __future__ import unicode_literals
-import copy
+import collections
 import inspect
+import operator
 
-from django.db import router
-from django.db.models import Model, Manager
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.db.models import AutoField, Model, Manager
 from django.db.models.query import RawQuerySet
 from django.utils import six
 
-from mosql.query import select, join, delete
-from mosql.util import raw, identifier, paren
+from mosql.query import select, join, delete, update
+from mosql.util import raw, identifier, paren, build_set, build_where
 
 from .compat import get_model
+from .db.cache import get_query_cache, make_fingerprint
+from .db.executors import QueryIterator, completed
 from .db.handlers import get_engine_handler
+from .db.patch import (
+    collect_params, format_placeholders, get_current_params
+)
+from .db.query import ChunkedRawQuery
+from .functions import LazyValueGenerator, resolve
+from .signals import compiling
 
 __all__ = ['MoQuerySet', 'MoManager']
 
 
+class QueryParams(collections.namedtuple('QueryParams', [
+        'offset', 'limit', 'alias', 'where', 'joins', 'group_by', 'order_by',
+        'keyset'])):
+    """Immutable state of the clauses in a :class:`MoQuerySet`
+
+    Sequences are stored as tuples, and mappings as tuples of pairs. Querysets
+    share their states and derive new ones with ``_replace``, so cloning a
+    queryset does not copy anything, and compiling a query does not need to
+    defensively copy it.
+    """
+    __slots__ = ()
+
+
+JoinInfo = collections.namedtuple('JoinInfo', [
+    'table', 'alias', 'on', 'using', 'type', 'hydrate',
+])
+
+_default_params = QueryParams(
+    offset=0, limit=None, alias=None, where=(), joins=(), group_by=(),
+    order_by=(), keyset=None,
+)
+
+
+def _to_pairs(mapping):
+    items = mapping.items() if hasattr(mapping, 'items') else mapping
+    return tuple(
+        (k, tuple(v) if isinstance(v, list) else v) for k, v in items
+    )
+
+
+def _update_pairs(pairs, mapping):
+    """Update a tuple of pairs like ``dict.update``, returning a new tuple."""
+    updates = collections.OrderedDict(_to_pairs(mapping))
+    result = []
+    for k, v in pairs:
+        if k in updates:
+            v = updates.pop(k)
+        result.append((k, v))
+    result.extend(updates.items())
+    return tuple(result)
+
+
+def _make_dict_row(names):
+    return lambda row: dict(zip(names, row))
+
+
+def _make_tuple_row(names):
+    return tuple
+
+
+def _make_flat_row(names):
+    return operator.itemgetter(0)
+
+
+def _make_named_row(names):
+    # Use the last part of qualified names (e.g. "d.name") as attributes.
+    Row = collections.namedtuple(
+        'Row', [n.rpartition('.')[2] for n in names], rename=True
+    )
+    return Row._make
+
+
+def _reverse_ordering(field):
+    """Reverse the direction of an ``ORDER BY`` item."""
+    if isinstance(field, LazyValueGenerator):
+        return field + ' DESC'
+    if field.endswith(' DESC'):
+        return field[:-len(' DESC')]
+    if field.endswith(' ASC'):
+        field = field[:-len(' ASC')]
+    return field + ' DESC'
+
+
+def _get_keyset_values(row, columns):
+    """Extract values of ``columns`` from a row for keyset pagination."""
+    if isinstance(row, Model):
+        names = {
+            f.get_attname_column()[1]: f.attname for f in row._meta.fields
+        }
+        values = []
+        for column in columns:
+            name = column.rpartition('.')[2]
+            values.append(getattr(row, names.get(name, name)))
+    elif hasattr(row, 'keys'):
+        values = [
+            row[c] if c in row else row[c.rpartition('.')[2]]
+            for c in columns
+        ]
+    else:
+        values = list(row)
+        if len(values) != len(columns):
+            raise ValueError(
+                'Expecting {expect} keyset values, got {got}'.format(
+                    expect=len(columns), got=len(values)
+                )
+            )
+    if any(v is None for v in values):
+        raise ValueError('Keyset values cannot be None')
+    return values
+
+
+def _get_field(opts, name):
+    """Get a field of a model by its name, or ``'pk'`` for the primary key."""
+    if name == 'pk':
+        return opts.pk
+    return opts.get_field(name)
+
+
+def _get_hydrated_columns(field, alias):
+    """Columns of a joined model selected to build related instances.
+
+    :returns: A list of 2-tuples ``(column, alias)``. Columns are aliased with
+        the name of the foreign key as prefix.
+    """
+    return [
+        ('{alias}.{column}'.format(alias=alias, column=f.column),
+         '{name}__{column}'.format(name=field.name, column=f.column))
+        for f in field.rel.to._meta.concrete_fields
+    ]
+
+
+def _make_instance(model, db, fields, values):
+    if hasattr(model, 'from_db'):   # Django 1.8+
+        return model.from_db(db, [f.attname for f in fields], values)
+    obj = model(**dict(zip((f.attname for f in fields), values)))
+    obj._state.adding = False
+    obj._state.db = db
+    return obj
+
+
+def _hydrate(objs, relations, db):
+    """Attach related instances built from hydrated columns to objects.
+
+    :param relations: Foreign keys of objects to populate.
+    """
+    for obj in objs:
+        for field in relations:
+            model = field.rel.to
+            fields = model._meta.concrete_fields
+            values = [
+                obj.__dict__.pop('{name}__{column}'.format(
+                    name=field.name, column=f.column
+                ))
+                for f in fields
+            ]
+            if all(v is None for v in values):  # Not matched by a LEFT JOIN.
+                related = None
+            else:
+                related = _make_instance(model, db, fields, values)
+            setattr(obj, field.get_cache_name(), related)
+        yield obj
+
+
+def _resolve_pairs(pairs):
+    """Render SQL functions in values of pairs for the current dialect."""
+    return tuple((k, resolve(v)) for k, v in pairs)
+
+
+def _compile_for_execution(build):
+    """Call ``build`` to generate SQL to be executed on a cursor.
+
+    If the ``MOSQL_PARAMETERIZED_QUERIES`` setting is set, values are passed
+    as query parameters. Otherwise they are inlined, and percent signs are
+    escaped so that the SQL can be passed to the cursor with empty parameters.
+
+    :returns: A 2-tuple ``(sql, params)``.
+    """
+    if getattr(settings, 'MOSQL_PARAMETERIZED_QUERIES', False):
+        with collect_params() as params:
+            sql = build()
+        return format_placeholders(sql), tuple(params)
+    return build().replace('%', '%%'), ()
+
+
+def _fetch_one(handler, sql, params, model=None):
+    """Execute SQL on the engine handler, and fetch the first row."""
+    cursor = handler.execute(sql, params, model)
+    try:
+        return cursor.fetchone()
+    finally:
+        cursor.close()
+
+
 class MoQuerySet(object):
     """Django query set wrapper to bridge with MoSQL"""
 
@@ -35,26 +228,39 @@ class MoQuerySet(object):
         :type using: `str` or `None`
         """
         self.model = model
-        self.extra_fields = extra_fields
+        self.extra_fields = tuple(extra_fields)
         self._db = using
         self._rawqueryset = None
+        self._result_cache = None
+        self._query_cache = {}
         self._for_write = False
-        self._params = {
-            'offset': 0,
-            'limit': None,
-            'alias': None,
-            'where': {},
-            'joins': [],
-            'group_by': [],
-            'order_by': []
-        }
+        self._params = _default_params
+        # Names of fields to fetch, and a callable that takes the names and
+        # returns a function to convert a row into an item, if the queryset
+        # is created by values() or values_list().
+        self._fields = None
+        self._row_factory = None
 
     def __repr__(self):
         return '<MoQuerySet: {query}>'.format(query=self.query)
 
     def __iter__(self):
-        """Iterate through the queryset using the backed RawQuerySet"""
-        return iter(self.resolve())
+        """Iterate through the queryset using the backed RawQuerySet
+
+        The query is only executed on the first iteration. Its result is
+        cached and reused afterwards.
+        """
+        self._fetch_all()
+        return iter(self._result_cache)
+
+    def __len__(self):
+        self._fetch_all()
+        return len(self._result_cache)
+
+    def __bool__(self):
+        return self.exists()
+
+    __nonzero__ = __bool__      # Python 2
 
     def __getitem__(self, k):
         if not isinstance(k, (slice,) + six.integer_types):
@@ -70,17 +276,27 @@ class MoQuerySet(object):
         ), 'Negative indexing is not supported.'
 
         if isinstance(k, slice):
-            clone = self._clone()
-            if k.start is not None:
-                clone._params['offset'] += k.start
+            start = k.start or 0
+            limit = self._params.limit
+            if limit is not None:
+                limit = max(limit - start, 0)
             if k.stop is not None:
-                limit = k.stop - (k.start or 0)
-                if (clone._params['limit'] is None
-                        or limit < clone._params['limit']):
-                    clone._params['limit'] = limit
+                stop = max(k.stop - start, 0)
+                limit = stop if limit is None else min(limit, stop)
+            clone = self._clone()
+            clone._params = self._params._replace(
+                offset=self._params.offset + start, limit=limit
+            )
             return clone
+        elif self._result_cache is not None:
+            return self._result_cache[k]
         else:
-            return list(self)[k]
+            # Fetch only the requested row with OFFSET k LIMIT 1.
+            limit = self._params.limit
+            if limit is None or k < limit:
+                for obj in self[k:k + 1]:
+                    return obj
+            raise IndexError('MoQuerySet index out of range')
 
     @property
     def db(self):
@@ -88,32 +304,231 @@ class MoQuerySet(object):
             return self._db or router.db_for_write(self.model)
         return self._db or router.db_for_read(self.model)
 
+    def _bind(self):
+        """Get a queryset that always uses the database this one is routed to.
+
+        The router is consulted on every access of :attr:`db`, and may choose
+        a different database each time. An evaluation binds the queryset once,
+        so that the query is compiled for and executed on the same database.
+        The clone shares memoized queries with this queryset.
+        """
+        if self._db is not None:
+            return self
+        db = self.db
+        if db is None:
+            return self
+        clone = self._clone()
+        clone._db = db
+        clone._query_cache = self._query_cache
+        return clone
+
+    def _fetch_all(self):
+        if self._result_cache is None:
+            if self._row_factory is None:
+                rawqueryset = self.resolve()
+                db = rawqueryset.db
+                handler = get_engine_handler(db)
+                with handler.executing(
+                    rawqueryset.raw_query, rawqueryset.params, self.model
+                ) as execution:
+                    self._result_cache = list(self._hydrate(rawqueryset, db))
+                    execution.row_count = len(self._result_cache)
+            else:
+                self._result_cache = list(self._iter_rows())
+
     def _clone(self):
-        clone = MoQuerySet(
+        # Clones start without a result cache since they are meant to be
+        # modified and evaluated on their own. The state is immutable and
+        # therefore shared.
+        clone = self.__class__(
             model=self.model,
-            extra_fields=copy.copy(self.extra_fields),
+            extra_fields=self.extra_fields,
             using=self._db
         )
-        for k in self._params:
-            clone._params[k] = copy.copy(self._params[k])
+        clone._params = self._params
+        clone._fields = self._fields
+        clone._row_factory = self._row_factory
         return clone
 
-    def _get_select_query(self, fields=None):
-        """The raw SQL that will be used to resolve the queryset."""
-        handler = get_engine_handler(self.db)
+    def _get_values_columns(self):
+        """Get names and columns of fields selected by values() queries.
 
+        Names can be names or attnames of model fields, ``'pk'``, attribute
+        names of extra fields, or column expressions that are selected as-is.
+
+        :returns: A 2-tuple ``(names, columns)``.
+        """
+        concrete_fields = self.model._meta.concrete_fields
+        names = self._fields
+        if not names:
+            names = tuple(f.attname for f in concrete_fields) + tuple(
+                attr for _, attr in self.extra_fields
+            )
+        columns_by_name = {'pk': self.model._meta.pk.column}
+        for f in concrete_fields:
+            columns_by_name[f.name] = columns_by_name[f.attname] = f.column
+        for field in self.extra_fields:
+            columns_by_name[field[1]] = field
+        columns = tuple(columns_by_name.get(n, n) for n in names)
+        return names, columns
+
+    def _get_values_query(self):
+        names, columns = self._get_values_columns()
+        sql, params = _compile_for_execution(
+            lambda: self._get_select_query(columns)
+        )
+        return names, sql, params
+
+    def _prepare(self):
+        """Compile the query so that it can be executed without compiling.
+
+        Compiled queries are memoized, so this is used to keep compilation in
+        the calling thread before a query is executed asynchronously.
+        """
+        if self._row_factory is None:
+            self.resolve()
+        else:
+            self._get_values_query()
+
+    def _iter_rows(self, chunk_size=None):
+        """Iterate through rows selected by a values() queryset.
+
+        Rows are fetched with a cursor directly, without instantiating model
+        objects. If ``chunk_size`` is given, rows are streamed from the
+        database that many at a time; otherwise all rows are fetched at once.
+        """
+        queryset = self._bind()
+        names, sql, params = queryset._get_values_query()
+        make_item = self._row_factory(names)
+        handler = get_engine_handler(queryset.db)
+        if chunk_size is None:
+            cursor = handler.execute(sql, params, self.model)
+            try:
+                rows = cursor.fetchall()
+            finally:
+                cursor.close()
+            for row in rows:
+                yield make_item(row)
+            return
+
+        cursor = handler.chunked_cursor()
+        try:
+            with handler.executing(sql, params, self.model):
+                cursor.execute(sql, params)
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield make_item(row)
+        finally:
+            cursor.close()
+
+    def _get_select_query(self, fields=None, parameterize=False):
+        """The raw SQL that will be used to resolve the queryset.
+
+        The compiled SQL is memoized on the queryset for each database. If the
+        ``MOSQL_QUERY_CACHE_SIZE`` setting is set, queries are also cached
+        process-wide, keyed by a fingerprint of the queryset's state.
+
+        :param fields: Columns to select. Each item can be a column name, a
+            qualified column, or a 2-tuple of an expression and its alias.
+            All columns of the model and extra fields are selected if omitted.
+        :param parameterize: If true, values are passed as query parameters
+            with ``%s`` placeholders instead of being inlined, and a 2-tuple
+            ``(sql, params)`` is returned.
+        """
+        if parameterize:
+            with collect_params() as params:
+                query = self._get_select_query(fields)
+            return format_placeholders(query), tuple(params)
+
+        db = self.db
+        if fields is not None:
+            fields = tuple(fields)
+        # Inside collect_params(), parameters of cached queries need to be
+        # added into the collected parameters.
+        collected = get_current_params()
+        key = (db, fields, collected is not None)
+        try:
+            query, params = self._query_cache[key]
+        except KeyError:
+            pass
+        else:
+            if collected is not None:
+                collected.extend(params)
+            return query
+
+        handler = get_engine_handler(db)
+        query_cache = get_query_cache()
+        fingerprint = None
+        if query_cache is not None:
+            try:
+                fingerprint = make_fingerprint((
+                    self.model, db, type(handler), handler.name, fields,
+                    collected is not None, self.extra_fields, self._params
+                ))
+            except TypeError:   # Unhashable parameters; don't cache.
+                pass
+            else:
+                cached = query_cache.get(fingerprint)
+                if cached is not None:
+                    self._query_cache[key] = cached
+                    if collected is not None:
+                        collected.extend(cached[1])
+                    return cached[0]
+
+        with compiling(self, db, handler.name) as compilation:
+            if collected is None:
+                query = self._compile_select_query(handler, fields)
+                params = ()
+            else:
+                with collect_params() as params:
+                    query = self._compile_select_query(handler, fields)
+                params = tuple(params)
+                collected.extend(params)
+            compilation.sql = query
+        self._query_cache[key] = (query, params)
+        if fingerprint is not None:
+            query_cache.set(fingerprint, (query, params))
+        return query
+
+    def _get_fingerprint(self):
+        """Fingerprint the state the query is compiled from.
+
+        Used by :func:`djangomosql.db.cache.make_fingerprint` when the
+        queryset is joined as a subquery.
+        """
+        # The subquery is compiled for its own database, which is resolved
+        # by the router at compile time if not set.
+        return make_fingerprint((
+            self.model, self._db, self.extra_fields, self._params
+        ))
+
+    def _compile_select_query(self, handler, fields):
         with handler.patch():
-            params = copy.deepcopy(self._params)
-            if params['joins']:
-                params['joins'] = [
-                    join(table=(j.pop('table'),), **j)
-                    for j in params['joins']
-                ]
+            params = self._params
+            kwargs = {}
+            if params.joins:
+                kwargs['joins'] = [self._compile_join(j) for j in params.joins]
 
             table = self.model._meta.db_table
-            alias = params.pop('alias', None)
+            alias = params.alias
 
-            kwargs = {k: v for k, v in params.items() if v}
+            # SQL functions are rendered for the dialect here.
+            where = _resolve_pairs(params.where)
+            if params.keyset:
+                # Conditions are rendered in order, so that collected
+                # parameters follow the SQL.
+                conditions = [build_where(where)] if where else []
+                conditions.append(handler.get_keyset_condition(*params.keyset))
+                where = ' AND '.join(conditions)
+            if where:
+                kwargs['where'] = where
+
+            for key in ('group_by', 'order_by', 'offset', 'limit'):
+                if getattr(params, key):
+                    kwargs[key] = resolve(getattr(params, key))
 
             # Inject default field names.
             # If this query does not contain a GROUP BY clause, we can safely
@@ -126,20 +541,33 @@ class MoQuerySet(object):
 
             if fields is not None:
                 kwargs['select'] = [
-                    f if '.' in f or isinstance(f, raw)
+                    resolve(f)
+                    if isinstance(f, (tuple, raw, LazyValueGenerator))
+                    or '.' in f
                     else raw('{table}.{field}'.format(
                         table=identifier(table_name), field=identifier(f))
                     ) for f in fields
                 ]
-            elif self._params['group_by']:
-                kwargs['select'] = (
-                    handler.get_aggregated_columns_for_group_by(self, 'MIN')
-                )
             else:
-                kwargs['select'] = handler.get_star(self)
-
-            kwargs['select'].extend(self.extra_fields)
-            if 'offset' in kwargs and 'limit' not in kwargs:
+                if params.group_by:
+                    kwargs['select'] = (
+                        handler.get_aggregated_columns_for_group_by(
+                            self, 'MIN'
+                        )
+                    )
+                else:
+                    kwargs['select'] = handler.get_star(self)
+                kwargs['select'].extend(resolve(self.extra_fields))
+                for join_info in params.joins:
+                    if join_info.hydrate is not None:
+                        field = self.model._meta.get_field(join_info.hydrate)
+                        kwargs['select'].extend(
+                            _get_hydrated_columns(field, join_info.alias)
+                        )
+            if params.limit == 0:
+                # MoSQL omits falsy values, so we need to be explicit.
+                kwargs['limit'] = raw('0')
+            elif 'offset' in kwargs and 'limit' not in kwargs:
                 kwargs['limit'] = handler.no_limit_value()
 
             if alias:
@@ -147,46 +575,540 @@ class MoQuerySet(object):
             query = select(table, **kwargs)
             return query
 
+    def _compile_join(self, join_info):
+        table = join_info.table
+        if isinstance(table, MoQuerySet):   # Subquery
+            table = raw(paren(table._get_select_query()))
+        kwargs = {
+            k: resolve(getattr(join_info, k)) for k in ('on', 'using', 'type')
+            if getattr(join_info, k) is not None
+        }
+        if join_info.hydrate is not None and not (
+                join_info.on or join_info.using):
+            # Join on the foreign key being hydrated.
+            field = self.model._meta.get_field(join_info.hydrate)
+            table_name = self._params.alias or self.model._meta.db_table
+            kwargs['on'] = {
+                '{table}.{column}'.format(
+                    table=table_name, column=field.column
+                ): '{alias}.{column}'.format(
+                    alias=join_info.alias,
+                    column=field.rel.get_related_field().column,
+                ),
+            }
+        return join(table=((table, join_info.alias),), **kwargs)
+
+    def _hydrate(self, objs, db):
+        """Populate foreign keys of objects hydrated by joins."""
+        relations = [
+            self.model._meta.get_field(j.hydrate)
+            for j in self._params.joins if j.hydrate is not None
+        ]
+        if not relations:
+            return objs
+        return _hydrate(objs, relations, db)
+
     @property
     def query(self):
         return self._get_select_query()
 
-    def delete(self):
-        """Delete objects selected by the QuerySet"""
+    def delete(self, batch_size=None, callback=None):
+        """Delete objects selected by the QuerySet
+
+        :param batch_size: If given, objects are deleted in batches of at most
+            this many rows, each with a separate ``DELETE`` query, so that no
+            single statement holds locks on all selected rows. Primary keys
+            of each batch are fetched with a keyset query, instead of being
+            selected all at once.
+        :param callback: A callable to report progress of a batched delete.
+            It is called with the number of rows deleted so far after each
+            batch.
+        :returns: The number of rows deleted.
+        """
         # Try to keep things simple by resolving a direct DELETE ... WHERE ...
         # query. If that proves impossible, fallback to the naive DELETE ...
         # WHERE <pk> IN (SELECT ...) solution.
         self._for_write = True
-        handler = get_engine_handler(self.db)
+        if batch_size is not None:
+            return self._delete_in_batches(batch_size, callback)
+        queryset = self._bind()
+        handler = get_engine_handler(queryset.db)
         table = self.model._meta.db_table
+        simple = self._is_simple()
 
-        params = copy.deepcopy(self._params)
-        where = params.pop('where')
-
-        with handler.patch():
-            if any(params.values()):
-                # If any of the remaining params is not empty, play safe and
-                # fallback to subquery
-                query = delete(table, where=handler.get_where_for_delete(self))
-            else:
-                # Try to be smart
-                query = delete(table, where=where)
+        def build():
+            with handler.patch():
+                if not simple:
+                    # If any of the remaining params is not empty, play safe
+                    # and fallback to subquery
+                    return delete(
+                        table, where=handler.get_where_for_delete(queryset)
+                    )
+                else:
+                    # Try to be smart
+                    return delete(table, where=_resolve_pairs(
+                        self._params.where
+                    ))
 
         # Execute the query
-        cursor = handler.cursor()
-        cursor.execute(query)
+        sql, params = _compile_for_execution(build)
+        cursor = handler.execute(sql, params, self.model)
+        self._result_cache = None
         return cursor.rowcount
 
+    def update(self, mapping):
+        """Update objects selected by the QuerySet with a single query
+
+        Example::
+
+            Fruit.objects.select().where({'kind': 'apple'}).update({
+                'price': raw('price * 1.1'),
+            })
+
+        :param mapping: A mapping of columns to their new values, used as the
+            ``SET`` clause of the ``UPDATE`` query.
+        :returns: The number of rows updated.
+        """
+        # Like delete(), try a direct UPDATE ... WHERE ... query first, and
+        # fallback to UPDATE ... WHERE <pk> IN (SELECT ...).
+        self._for_write = True
+        queryset = self._bind()
+        handler = get_engine_handler(queryset.db)
+        table = self.model._meta.db_table
+        simple = self._is_simple()
+
+        def build():
+            with handler.patch():
+                values = mapping
+                if not isinstance(values, six.string_types):
+                    values = _resolve_pairs(_to_pairs(values))
+                # The SET clause is rendered before the subquery, so that
+                # parameters are collected in the order they appear in SQL.
+                values = raw(build_set(values))
+                if not simple:
+                    where = handler.get_where_for_update(queryset)
+                else:
+                    where = _resolve_pairs(self._params.where)
+                return update(table, where=where, set=values)
+
+        sql, params = _compile_for_execution(build)
+        cursor = handler.execute(sql, params, self.model)
+        self._result_cache = None
+        return cursor.rowcount
+
+    def _is_simple(self):
+        """Whether rows can be selected with only the ``WHERE`` clause"""
+        params = self._params
+        return not (
+            params.offset or params.limit is not None or params.alias
+            or params.joins or params.group_by or params.order_by
+            or params.keyset
+        )
+
+    def _delete_in_batches(self, batch_size, callback):
+        assert batch_size > 0, 'batch_size must be positive.'
+        pk = self.model._meta.pk
+        # Fetch primary keys from the database objects are deleted from.
+        queryset = self._bind()
+        params = self._params
+        if (params.offset or params.limit is not None or params.group_by
+                or params.keyset):
+            # Rows selected by sliced or aggregated queries change as rows are
+            # deleted, so the primary keys need to be fetched beforehand.
+            pks = list(queryset.values_list(pk.attname, flat=True))
+            batches = [
+                pks[i:i + batch_size] for i in range(0, len(pks), batch_size)
+            ]
+        else:
+            batches = queryset._iter_pk_batches(batch_size)
+
+        handler = get_engine_handler(queryset.db)
+        table = self.model._meta.db_table
+        deleted = 0
+        for batch in batches:
+            sql, sql_params = _compile_for_execution(
+                lambda: handler.get_batch_delete_query(table, pk.column, batch)
+            )
+            cursor = handler.execute(sql, sql_params, self.model)
+            try:
+                deleted += cursor.rowcount
+            finally:
+                cursor.close()
+            if callback is not None:
+                callback(deleted)
+        self._result_cache = None
+        return deleted
+
+    def _iter_pk_batches(self, batch_size):
+        """Iterate through primary keys of selected rows in batches
+
+        Batches are selected in the order of primary keys, each one seeking
+        past the last key of the previous batch.
+        """
+        pk = self.model._meta.pk
+        queryset = self._clone()
+        queryset._params = self._params._replace(order_by=())
+        last = None
+        while True:
+            pks = list(queryset.paginate_after(last, batch_size).values_list(
+                pk.attname, flat=True
+            ))
+            if pks:
+                yield pks
+            if len(pks) < batch_size:
+                break
+            last = pks[-1:]
+
     def resolve(self):
         """Resolve the queryset."""
         if self._rawqueryset is None:
+            queryset = self._bind()
+            sql, params = _compile_for_execution(queryset._get_select_query)
             self._rawqueryset = RawQuerySet(
-                raw_query=self.query, model=self.model, using=self._db
+                raw_query=sql, params=params, model=self.model,
+                using=queryset._db,
             )
         return self._rawqueryset
 
+    def iterator(self, chunk_size=2000):
+        """Iterate through the selected objects without caching them.
+
+        Rows are streamed from the database ``chunk_size`` at a time, using a
+        server-side cursor if the database supports it, so that memory usage
+        is bounded regardless of the size of the result.
+        """
+        if self._row_factory is not None:
+            return self._iter_rows(chunk_size)
+        queryset = self._bind()
+        db = queryset.db
+        sql, params = _compile_for_execution(queryset._get_select_query)
+        query = ChunkedRawQuery(
+            sql, db, params=params, chunk_size=chunk_size, model=self.model
+        )
+        return iter(self._hydrate(RawQuerySet(
+            raw_query=query.sql, model=self.model, query=query, using=db
+        ), db))
+
+    def copy_to(self, fileobj, format='csv'):
+        """Export rows selected by the queryset into a file
+
+        Rows are streamed into the file with bounded memory. PostgreSQL uses
+        ``COPY (...) TO STDOUT``, which also supports the ``'binary'`` format;
+        other databases fetch rows in chunks and write them as CSV.
+
+        :param fileobj: A writable file-like object.
+        :param format: ``'csv'`` or ``'binary'``.
+        :returns: The number of rows exported.
+        """
+        queryset = self._bind()
+        return get_engine_handler(queryset.db).copy_to(
+            queryset, fileobj, format
+        )
+
+    def explain(self, analyze=False, format='text'):
+        """Get the execution plan of the query from the database.
+
+        The plan is requested with engine-specific syntax, e.g. ``EXPLAIN
+        (FORMAT JSON)`` on PostgreSQL, ``EXPLAIN FORMAT=JSON`` on MySQL, and
+        ``EXPLAIN QUERY PLAN`` on SQLite.
+
+        :param analyze: If true, the query is executed to include actual
+            timings in the plan. Not supported on SQLite.
+        :param format: ``'text'`` for the plan as the database displays it,
+            or ``'json'`` for a structured plan of lists and dicts.
+        :returns: A string for the text format, or a list for JSON.
+        """
+        queryset = self._bind()
+        if self._row_factory is None:
+            sql, params = _compile_for_execution(queryset._get_select_query)
+        else:
+            _, sql, params = queryset._get_values_query()
+        return get_engine_handler(queryset.db).explain(
+            sql, params, analyze=analyze, format=format
+        )
+
     def count(self):
-        return len(list(self))
+        """Count the number of objects selected by the queryset.
+
+        The rows are counted by the database with a ``SELECT COUNT(*)`` query,
+        instead of being fetched and instantiated. If the queryset is already
+        evaluated, the cached result is counted instead.
+        """
+        if self._result_cache is not None:
+            return len(self._result_cache)
+        queryset = self._bind()
+        handler = get_engine_handler(queryset.db)
+        return _fetch_one(handler, *_compile_for_execution(
+            lambda: handler.get_count_query(queryset)
+        ), model=self.model)[0]
+
+    def exists(self):
+        """Whether the queryset selects any object.
+
+        A query selecting at most one row is executed, instead of fetching
+        all objects. If the queryset is already evaluated, its result is used
+        instead.
+        """
+        if self._result_cache is not None:
+            return bool(self._result_cache)
+        queryset = self._bind()
+        handler = get_engine_handler(queryset.db)
+        return _fetch_one(handler, *_compile_for_execution(
+            lambda: handler.get_exists_query(queryset)
+        ), model=self.model) is not None
+
+    def first(self):
+        """Get the first object selected, or `None` if there is none."""
+        try:
+            return self[0]
+        except IndexError:
+            return None
+
+    def last(self):
+        """Get the last object selected, or `None` if there is none.
+
+        The ordering of the queryset is reversed so that only one row needs to
+        be fetched. If the queryset is not ordered, the primary key is used.
+        """
+        if self._params.offset or self._params.limit is not None:
+            # Reversing a sliced query selects different rows. Locate the
+            # last row by counting instead.
+            count = self.count()
+            return self[count - 1] if count else None
+        order_by = self._params.order_by or [self._get_pk_ordering()]
+        clone = self._clone()
+        clone._params = self._params._replace(
+            order_by=tuple(_reverse_ordering(f) for f in order_by)
+        )
+        return clone.first()
+
+    def get(self, mapping=None):
+        """Get the single object selected by the queryset.
+
+        :param mapping: An optional mapping to be added into the ``WHERE``
+            clause before fetching. See :meth:`where`.
+        :raises: ``DoesNotExist`` if no object is found, or
+            ``MultipleObjectsReturned`` if more than one are found.
+        """
+        clone = self.where(mapping) if mapping else self
+        return self._get_single(list(clone[:2]))
+
+    def _get_single(self, objs):
+        if len(objs) == 1:
+            return objs[0]
+        opts = self.model._meta
+        if not objs:
+            raise self.model.DoesNotExist(
+                '{model} matching query does not exist.'.format(
+                    model=opts.object_name
+                )
+            )
+        raise self.model.MultipleObjectsReturned(
+            'get() returned more than one {model}.'.format(
+                model=opts.object_name
+            )
+        )
+
+    def aiter(self):
+        """Fetch the selected objects asynchronously.
+
+        The query is compiled in the calling thread, and executed by the
+        engine handler, in a thread pool dedicated to the database by default.
+        All objects are fetched at once and cached in the queryset.
+
+        Usage::
+
+            people = await Person.objects.select().aiter()
+            async for person in Person.objects.select().aiter():
+                ...
+
+        :rtype: :class:`djangomosql.db.executors.QueryIterator`
+        """
+        if self._result_cache is not None:
+            return QueryIterator(completed(self._result_cache).future)
+        queryset = self._bind()
+        queryset._prepare()
+
+        def fetch():
+            queryset._fetch_all()
+            self._result_cache = queryset._result_cache
+            return self._result_cache
+
+        handler = get_engine_handler(queryset.db)
+        return QueryIterator(handler.submit(fetch).future)
+
+    def acount(self):
+        """Asynchronous version of :meth:`count`.
+
+        :rtype: :class:`djangomosql.db.executors.QueryFuture`
+        """
+        if self._result_cache is not None:
+            return completed(len(self._result_cache))
+        queryset = self._bind()
+        handler = get_engine_handler(queryset.db)
+        sql, params = _compile_for_execution(
+            lambda: handler.get_count_query(queryset)
+        )
+        return handler.submit(
+            lambda: _fetch_one(handler, sql, params, self.model)[0]
+        )
+
+    def aexists(self):
+        """Asynchronous version of :meth:`exists`.
+
+        :rtype: :class:`djangomosql.db.executors.QueryFuture`
+        """
+        if self._result_cache is not None:
+            return completed(bool(self._result_cache))
+        queryset = self._bind()
+        handler = get_engine_handler(queryset.db)
+        sql, params = _compile_for_execution(
+            lambda: handler.get_exists_query(queryset)
+        )
+        return handler.submit(
+            lambda: _fetch_one(handler, sql, params, self.model) is not None
+        )
+
+    def aget(self, mapping=None):
+        """Asynchronous version of :meth:`get`.
+
+        :rtype: :class:`djangomosql.db.executors.QueryFuture`
+        """
+        clone = (self.where(mapping) if mapping else self)[:2]._bind()
+        clone._prepare()
+        return get_engine_handler(clone.db).submit(
+            lambda: self._get_single(list(clone))
+        )
+
+    def adelete(self, batch_size=None, callback=None):
+        """Asynchronous version of :meth:`delete`.
+
+        The callback is called in the thread executing the query.
+
+        :rtype: :class:`djangomosql.db.executors.QueryFuture`
+        """
+        self._for_write = True
+        return get_engine_handler(self.db).submit(
+            self.delete, batch_size, callback
+        )
+
+    def aupdate(self, mapping):
+        """Asynchronous version of :meth:`update`.
+
+        :rtype: :class:`djangomosql.db.executors.QueryFuture`
+        """
+        self._for_write = True
+        return get_engine_handler(self.db).submit(self.update, mapping)
+
+    def paginate_after(self, last=None, page_size=None):
+        """Select objects following ``last`` in the ordering of the queryset.
+
+        This implements keyset (seek) pagination. Instead of skipping rows with
+        ``OFFSET``, a ``WHERE`` condition selects rows after the last row of
+        the previous page, so any page costs the same as the first one.
+
+        The primary key is appended to the ordering to make it total, unless
+        the query is aggregated (with ``GROUP BY``). Ordering columns must not
+        contain ``NULL`` values, and must be real columns instead of aliases
+        of extra fields since they are referenced in the ``WHERE`` clause.
+
+        Example::
+
+            page = Fruit.objects.select().order_by('price')[:20]
+            next_page = page.paginate_after(page[19], 20)
+
+        :param last: The last row of the previous page. Can be a model
+            instance, a mapping, or a sequence of values for each column in
+            the ordering. If `None`, the first page is selected.
+        :param page_size: Number of objects in a page. If `None`, all objects
+            after ``last`` are selected.
+        """
+        assert (
+            not self._params.offset and self._params.limit is None
+        ), 'Cannot paginate a query once a slice has been taken.'
+        ordering = self._get_keyset_ordering()
+        keyset = None
+        if last is not None:
+            values = _get_keyset_values(last, [c for c, _ in ordering])
+            keyset = (ordering, tuple(values))
+        clone = self._clone()
+        clone._params = self._params._replace(
+            order_by=tuple(
+                c + ' DESC' if descending else c for c, descending in ordering
+            ),
+            keyset=keyset,
+        )
+        if page_size is not None:
+            clone = clone[:page_size]
+        return clone
+
+    def _get_keyset_ordering(self):
+        ordering = []
+        for f in self._params.order_by:
+            column, _, direction = f.partition(' ')
+            ordering.append((column, direction == 'DESC'))
+        if self._params.group_by:
+            return tuple(ordering)
+        pkcol = self.model._meta.pk.get_attname_column()[1]
+        if all(c.rpartition('.')[2] != pkcol for c, _ in ordering):
+            ordering.append((self._get_pk_ordering(), False))
+        return tuple(ordering)
+
+    def _get_pk_ordering(self):
+        pkcol = self.model._meta.pk.get_attname_column()[1]
+        if self._params.group_by:
+            # Aggregated queries can only be ordered by the output column.
+            return pkcol
+        table = self._params.alias or self.model._meta.db_table
+        return '{table}.{pkcol}'.format(table=table, pkcol=pkcol)
+
+    def values(self, *fields):
+        """Select rows as dicts instead of model instances.
+
+        Rows are fetched with a cursor directly, skipping model instantiation.
+
+        :param fields: Names of fields to select. Each can be a name or an
+            attname of a model field, ``'pk'``, an attribute name of an extra
+            field, or a column expression, e.g. ``'d.name'``. The names are
+            used as keys of the dicts. All model fields (by their attnames)
+            and extra fields are selected if omitted.
+        """
+        return self._values(fields, _make_dict_row)
+
+    def values_list(self, *fields, **kwargs):
+        """Select rows as tuples instead of model instances.
+
+        Like :meth:`values`, but each row is a tuple of values in the order
+        of ``fields``.
+
+        :param flat: If true, each row is a single value instead of a tuple.
+            Only valid when exactly one field is selected.
+        :param named: If true, each row is a namedtuple with field names as
+            attributes.
+        """
+        flat = kwargs.pop('flat', False)
+        named = kwargs.pop('named', False)
+        if kwargs:
+            raise TypeError('Unexpected keyword arguments to values_list: '
+                            '{names}'.format(names=', '.join(sorted(kwargs))))
+        if flat and named:
+            raise TypeError("'flat' and 'named' can't be used together.")
+        if flat and len(fields) != 1:
+            raise TypeError("'flat' is not valid when values_list is called "
+                            "with more or less than one field.")
+        if flat:
+            make_row = _make_flat_row
+        elif named:
+            make_row = _make_named_row
+        else:
+            make_row = _make_tuple_row
+        return self._values(fields, make_row)
+
+    def _values(self, fields, row_factory):
+        clone = self._clone()
+        clone._fields = fields or None
+        clone._row_factory = row_factory
+        return clone
 
     def select(self, *extra_fields_as):
         """Provide extra fields to select on.
@@ -205,7 +1127,7 @@ class MoQuerySet(object):
         :type alias: `str`
         """
         clone = self._clone()
-        clone._params['alias'] = alias
+        clone._params = self._params._replace(alias=alias)
         return clone
 
     def where(self, mapping):
@@ -222,13 +1144,22 @@ class MoQuerySet(object):
 
         """
         clone = self._clone()
-        clone._params['where'].update(mapping)
+        clone._params = self._params._replace(
+            where=_update_pairs(self._params.where, mapping)
+        )
         return clone
 
     def group_by(self, *fields):
-        """Create a ``GROUP BY`` clause in the query."""
+        """Create a ``GROUP BY`` clause in the query.
+
+        Aggregated queries cannot hydrate related instances from joins.
+        """
+        if any(j.hydrate is not None for j in self._params.joins):
+            raise ValueError('Cannot aggregate a query hydrating joins')
         clone = self._clone()
-        clone._params['group_by'] += list(fields)
+        clone._params = self._params._replace(
+            group_by=self._params.group_by + fields
+        )
         return clone
 
     def order_by(self, *fields):
@@ -243,6 +1174,10 @@ class MoQuerySet(object):
         # "-field DESC"
         order_by = []
         for f in fields:
+            if isinstance(f, LazyValueGenerator):
+                # SQL functions are rendered when the query is compiled.
+                order_by.append(f)
+                continue
             parts = f.split(' ')
             if len(parts) == 1:
                 fieldname = parts[0]
@@ -254,10 +1189,13 @@ class MoQuerySet(object):
             else:
                 raise SyntaxError('Invalid ordering field {}'.format(f))
         clone = self._clone()
-        clone._params['order_by'] += order_by
+        clone._params = self._params._replace(
+            order_by=self._params.order_by + tuple(order_by)
+        )
         return clone
 
-    def join(self, model, alias, on=None, using=None, join_type=None):
+    def join(self, model, alias, on=None, using=None, join_type=None,
+             hydrate=None):
         """Create a ``JOIN`` clause in the query.
 
         :param model: A model to be joined on. This can be a model class, or
@@ -276,26 +1214,54 @@ class MoQuerySet(object):
             include ``INNER``, ``LEFT``, ``CROSS`` and other standard SQL
             ``JOIN`` types. If ommited, a suitable type will be inferred
             automatically.
+        :param hydrate: The name of a foreign key to the joined model. If
+            given, columns of the joined model are selected as well, and
+            related instances are built from them, so that accessing the
+            foreign key does not need another query. The model is joined on
+            the foreign key if ``on`` and ``using`` are omitted, with a
+            ``LEFT JOIN`` if the foreign key is nullable. Aggregated queries
+            (with ``GROUP BY``) cannot be hydrated.
+        :type hydrate: `str`
         """
         if isinstance(model, six.string_types):   # Try to lazy-load the model
             parts = model.split('.')
             if len(parts) == 2 and all(parts):
                 model = get_model(*parts) or model
-        elif isinstance(model, MoQuerySet):     # Handle subquery
-            model = raw(paren(model.query))
 
         if inspect.isclass(model) and issubclass(model, Model):
             table = model._meta.db_table
-        elif isinstance(model, six.string_types):
+        elif isinstance(model, (MoQuerySet,) + six.string_types):
+            # A subquery is compiled with the query, so its parameters can be
+            # collected correctly.
             table = model
         else:
             raise TypeError('join() arg 1 must be a Django model or a str '
                             'subclass instance')
+        if hydrate is not None:
+            field = self.model._meta.get_field(hydrate)
+            rel = getattr(field, 'rel', None)
+            if (rel is None or not inspect.isclass(model)
+                    or not issubclass(model, rel.to)):
+                raise ValueError(
+                    'Cannot hydrate {name} from {model!r}'.format(
+                        name=hydrate, model=model
+                    )
+                )
+            if self._params.group_by:
+                # Columns of the joined model are not aggregated.
+                raise ValueError('Cannot hydrate joins of aggregated queries')
+            if join_type is None and on is None and using is None:
+                join_type = 'LEFT' if field.null else 'INNER'
+        join_info = JoinInfo(
+            table=table, alias=alias,
+            on=None if on is None else _to_pairs(on),
+            using=None if using is None else tuple(using),
+            type=join_type, hydrate=hydrate,
+        )
         clone = self._clone()
-        join_info = {'table': (table, alias), 'on': on, 'using': using}
-        if join_type is not None:
-            join_info['type'] = join_type
-        clone._params['joins'].append(join_info)
+        clone._params = self._params._replace(
+            joins=self._params.joins + (join_info,)
+        )
         return clone
 
 
@@ -313,3 +1279,145 @@ class MoManager(Manager):
             extra_fields=extra_fields_as,
             using=self._db
         )
+
+    def bulk_insert(self, rows, batch_size=None, on_conflict=None,
+                    conflict_fields=None, update_fields=None):
+        """Insert rows with multi-row ``INSERT`` queries
+
+        Rows are inserted in batches inside a transaction, with values passed
+        as query parameters. The batch size is limited by the number of
+        parameters the database accepts in a query.
+
+        Example::
+
+            Fruit.objects.bulk_insert(
+                [{'kind': 'apple', 'variety': 'fuji', 'price': 0.24}],
+                on_conflict='update', conflict_fields=['kind', 'variety'],
+            )
+
+        :param rows: Model instances, or mappings of field names to values.
+            All mappings should contain the same fields. ``'pk'`` can be used
+            as the name of the primary key. Auto-incrementing primary keys of
+            instances are only inserted if all of them are set.
+        :param batch_size: Maximum number of rows inserted in a query.
+        :param on_conflict: `None` to fail on conflicts, ``'ignore'`` to skip
+            conflicting rows, or ``'update'`` to update existing rows instead.
+            Conflicts are handled by the database engine handler.
+        :param conflict_fields: Names of fields in the unique constraint that
+            conflicts are checked against. Required to update on conflicts on
+            backends other than MySQL.
+        :param update_fields: Names of fields to be updated on conflicts. All
+            inserted fields except ``conflict_fields`` and the primary key are
+            updated if omitted.
+        :returns: The number of rows affected, as reported by the database.
+        """
+        if on_conflict not in (None, 'ignore', 'update'):
+            raise ValueError('Invalid on_conflict value {value!r}'.format(
+                value=on_conflict
+            ))
+        rows = list(rows)
+        if not rows:
+            return 0
+        opts = self.model._meta
+        db = self._db or router.db_for_write(self.model)
+        connection = connections[db]
+
+        if isinstance(rows[0], Model):
+            fields = [
+                f for f in opts.concrete_fields
+                if not isinstance(f, AutoField)
+                or all(getattr(row, f.attname) is not None for row in rows)
+            ]
+            values = [
+                [f.get_db_prep_save(f.pre_save(row, True), connection)
+                 for f in fields]
+                for row in rows
+            ]
+        else:
+            names = list(rows[0])
+            fields = [_get_field(opts, name) for name in names]
+            values = [
+                [f.get_db_prep_save(row[name], connection)
+                 for f, name in zip(fields, names)]
+                for row in rows
+            ]
+
+        columns = [f.column for f in fields]
+        conflict_columns = [
+            _get_field(opts, name).column for name in conflict_fields or ()
+        ]
+        if update_fields is None:
+            update_columns = [
+                f.column for f in fields
+                if not f.primary_key and f.column not in conflict_columns
+            ]
+        else:
+            update_columns = [
+                _get_field(opts, name).column for name in update_fields
+            ]
+        if on_conflict == 'update' and not update_columns:
+            raise ValueError('No fields to update on conflicts')
+
+        handler = get_engine_handler(db)
+        size = handler.get_batch_size(fields, values)
+        if batch_size is not None:
+            size = min(size, batch_size)
+        affected = 0
+        with transaction.atomic(using=db, savepoint=False):
+            for start in range(0, len(values), size):
+                with collect_params() as params:
+                    sql = handler.get_insert_query(
+                        opts.db_table, columns, values[start:start + size],
+                        on_conflict, conflict_columns, update_columns
+                    )
+                cursor = handler.execute(
+                    format_placeholders(sql), params, self.model
+                )
+                try:
+                    affected += cursor.rowcount
+                finally:
+                    cursor.close()
+        return affected
+
+    def copy_from(self, source, columns=None, format='csv'):
+        """Load rows into the table of the model
+
+        PostgreSQL uses ``COPY ... FROM STDIN``, which also supports the
+        ``'binary'`` format. Other databases insert rows in batches with
+        multi-row ``INSERT`` queries. Values are loaded as-is, without being
+        prepared by model fields.
+
+        :param source: A file-like object containing rows in ``format``, or
+            an iterable of rows, each a sequence of values for each column.
+        :param columns: Names of fields in the order of values in each row.
+            All concrete fields of the model are loaded if omitted.
+        :param format: ``'csv'`` or ``'binary'``.
+        :returns: The number of rows loaded.
+        """
+        opts = self.model._meta
+        if columns is None:
+            columns = [f.column for f in opts.concrete_fields]
+        else:
+            columns = [_get_field(opts, name).column for name in columns]
+        db = self._db or router.db_for_write(self.model)
+        return get_engine_handler(db).copy_from(
+            opts.db_table, source, columns, format
+        )
+
+    def abulk_insert(self, rows, **kwargs):
+        """Asynchronous version of :meth:`bulk_insert`.
+
+        :rtype: :class:`djangomosql.db.executors.QueryFuture`
+        """
+        db = self._db or router.db_for_write(self.model)
+        return get_engine_handler(db).submit(self.bulk_insert, rows, **kwargs)
+
+    def acopy_from(self, source, columns=None, format='csv'):
+        """Asynchronous version of :meth:`copy_from`.
+
+        :rtype: :class:`djangomosql.db.executors.QueryFuture`
+        """
+        db = self._db or router.db_for_write(self.model)
+        return get_engine_handler(db).submit(
+            self.copy_from, source, columns, format
+        )
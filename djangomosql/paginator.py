@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from django.core.paginator import Paginator, Page
+
+__all__ = ['KeysetPaginator', 'KeysetPage']
+
+
+class KeysetPage(Page):
+    """A page of objects fetched by :class:`KeysetPaginator`
+
+    Keyset pages are not numbered. Use :attr:`next_after` to fetch the next
+    page instead.
+    """
+    def __init__(self, object_list, paginator, after, has_next):
+        super(KeysetPage, self).__init__(object_list, None, paginator)
+        self.after = after
+        self._has_next = has_next
+
+    def __repr__(self):
+        return '<KeysetPage after {after!r}>'.format(after=self.after)
+
+    @property
+    def next_after(self):
+        """The value to pass to :meth:`KeysetPaginator.page_after` for the next
+        page, or `None` if this is the last page.
+        """
+        if not self._has_next:
+            return None
+        return self.object_list[-1]
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self.after is not None
+
+    def next_page_number(self):
+        raise NotImplementedError('Keyset pages are not numbered.')
+
+    def previous_page_number(self):
+        raise NotImplementedError('Keyset pages are not numbered.')
+
+    def start_index(self):
+        raise NotImplementedError('Keyset pages are not numbered.')
+
+    def end_index(self):
+        raise NotImplementedError('Keyset pages are not numbered.')
+
+
+class KeysetPaginator(Paginator):
+    """Paginator using keyset (seek) pagination on a MoQuerySet
+
+    Numbered pages are still available through :meth:`page`, but
+    :meth:`page_after` should be preferred since its cost does not grow with
+    the depth of the page. See
+    :meth:`djangomosql.models.MoQuerySet.paginate_after`.
+
+    Usage::
+
+        paginator = KeysetPaginator(Fruit.objects.select().order_by('price'),
+                                    per_page=20)
+        page = paginator.page_after(None)
+        while page.has_next():
+            page = paginator.page_after(page.next_after)
+    """
+    def page_after(self, after=None):
+        """Returns the page of objects following ``after``
+
+        :param after: The last row of the previous page. See
+            :meth:`djangomosql.models.MoQuerySet.paginate_after`.
+        """
+        # Fetch one more object to see whether there is a next page.
+        queryset = self.object_list.paginate_after(after, self.per_page + 1)
+        objects = list(queryset)
+        has_next = len(objects) > self.per_page
+        return KeysetPage(objects[:self.per_page], self, after, has_next)
@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import functools
+import heapq
+
+from django.db import connections
+from django.db.models import Model
+
+from .db.executors import _get_futures
+
+__all__ = ['gather', 'merge_sorted', 'iter_merged']
+
+
+@functools.total_ordering
+class _Descending(object):
+    """Wraps a value to reverse its ordering"""
+
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __eq__(self, other):
+        return self.value == other.value
+
+    def __ne__(self, other):
+        return self.value != other.value
+
+    def __lt__(self, other):
+        return other.value < self.value
+
+
+def _get_ordering(queryset):
+    ordering = []
+    for f in queryset._params.order_by:
+        column, _, direction = f.partition(' ')
+        ordering.append((column.rpartition('.')[2], direction == 'DESC'))
+    return ordering
+
+
+def _make_key(ordering):
+    def key(row):
+        if isinstance(row, Model):
+            names = {f.column: f.attname for f in row._meta.concrete_fields}
+            values = [getattr(row, names.get(c, c)) for c, _ in ordering]
+        elif hasattr(row, 'keys'):
+            values = [row[c] for c, _ in ordering]
+        else:
+            raise TypeError('Cannot merge {type} rows by columns'.format(
+                type=type(row).__name__
+            ))
+        return tuple(
+            _Descending(v) if descending else v
+            for v, (_, descending) in zip(values, ordering)
+        )
+    return key
+
+
+def merge_sorted(results, ordering):
+    """Merge sorted lists of rows into a single sorted list
+
+    A k-way merge is performed with a heap, so each row is only compared
+    against the heads of other lists. Rows that compare equal keep the order
+    of the lists they are from.
+
+    :param results: Lists of model instances or mappings, each sorted by
+        ``ordering``.
+    :param ordering: A sequence of 2-tuples ``(column, descending)``.
+    """
+    return list(iter_merged(results, ordering))
+
+
+def iter_merged(results, ordering):
+    """Lazily merge sorted iterables of rows
+
+    Like :func:`merge_sorted`, but rows are pulled from each iterable only
+    when needed, so the results can be streamed.
+    """
+    key = _make_key(ordering)
+
+    def decorate(i, rows):
+        for j, row in enumerate(rows):
+            yield key(row), i, j, row
+
+    decorated = [decorate(i, rows) for i, rows in enumerate(results)]
+    for _, _, _, row in heapq.merge(*decorated):
+        yield row
+
+
+def _fetch(queryset):
+    if queryset._result_cache is not None:
+        return list(queryset)
+    # Bind the queryset so the connection it is executed on can be closed.
+    bound = queryset._bind()
+    try:
+        result = list(bound)
+    finally:
+        # Threads of the pool are discarded afterwards. Scattered querysets
+        # are executed on all shards.
+        db = bound.db
+        for alias in [db] if db is not None else bound.shards:
+            connections[alias].close()
+    queryset._result_cache = bound._result_cache
+    return result
+
+
+def gather(*querysets, **kwargs):
+    """Evaluate independent querysets concurrently
+
+    Each queryset is evaluated on a connection of its own thread, so querysets
+    on different databases (or the same one) are executed in parallel, and
+    the total time is bound by the slowest one instead of the sum of all.
+
+    Example::
+
+        results = gather(*[
+            Sale.objects.db_manager(db).select().order_by('-amount')[:10]
+            for db in shards
+        ], merge=True)
+
+    :param max_workers: If given, querysets are evaluated in a dedicated pool
+        of this many threads. Otherwise they are executed asynchronously by
+        their engine handlers, in the thread pool of each database by default.
+    :param merge: If true, the results are merged into a single list sorted by
+        the ``ORDER BY`` clause shared by all querysets. Rows need to be model
+        instances or mappings, e.g. from ``values()``.
+    :returns: A list of results of each queryset, in the order of arguments,
+        or a single merged list if ``merge`` is true.
+    """
+    max_workers = kwargs.pop('max_workers', None)
+    merge = kwargs.pop('merge', False)
+    if kwargs:
+        raise TypeError('Unexpected keyword arguments to gather: '
+                        '{names}'.format(names=', '.join(sorted(kwargs))))
+
+    ordering = None
+    if merge and querysets:
+        orderings = set(tuple(_get_ordering(qs)) for qs in querysets)
+        ordering = orderings.pop()
+        if orderings or not ordering:
+            raise ValueError('Querysets need the same ordering to be merged')
+
+    if max_workers is None:
+        pending = [qs.aiter() for qs in querysets]
+        results = [future.result() for future in pending]
+    else:
+        futures = _get_futures()
+        with futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(_fetch, querysets))
+
+    if ordering is not None:
+        return merge_sorted(results, ordering)
+    return results
@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import itertools
+import threading
+import time
+
+from django.conf import settings
+from django.core.signals import request_started
+from django.db import (
+    DatabaseError, DEFAULT_DB_ALIAS, InterfaceError, OperationalError,
+    connections,
+)
+
+from .db.handlers import get_outstanding_queries
+from .db.patch import _ContextLocal
+from .signals import execute_failed
+
+__all__ = ['ReplicaRouter']
+
+
+# Time until which reads are pinned to the primary in the current context.
+_pinned_until = _ContextLocal('djangomosql_pinned_until')
+
+
+def _unpin(**kwargs):
+    _pinned_until.set(None)
+
+
+# Pins are scoped to a request.
+request_started.connect(_unpin)
+
+
+class ReplicaRouter(object):
+    """A database router balancing reads between replicas
+
+    Add ``'djangomosql.routers.ReplicaRouter'`` to ``DATABASE_ROUTERS`` to
+    use it. Writes are routed to the primary database, and reads to one of
+    the replicas. The router is configured by the following settings:
+
+    ``MOSQL_PRIMARY_DATABASE``
+        Alias of the primary database. ``'default'`` by default.
+    ``MOSQL_REPLICA_DATABASES``
+        Aliases of the replicas. Reads are routed to the primary if empty.
+    ``MOSQL_REPLICA_BALANCE``
+        ``'round-robin'`` (default) to spread reads evenly, or
+        ``'least-outstanding'`` to choose the replica with the fewest queries
+        in progress in this process.
+    ``MOSQL_PIN_SECONDS``
+        After a write, reads in the same request (or thread) are routed to
+        the primary for this many seconds (5 by default), so that they do
+        not see stale data because of replication lag.
+    ``MOSQL_REPLICA_RETRY_SECONDS``
+        A replica that cannot be connected to, or loses its connection while
+        executing a query, is skipped for this many seconds (30 by default).
+        Reads fail over to other replicas, or the primary if none is
+        available.
+    """
+    def __init__(self):
+        super(ReplicaRouter, self).__init__()
+        self._counter = itertools.count()
+        self._unavailable = {}
+        self._lock = threading.Lock()
+        execute_failed.connect(self._execute_failed)
+
+    @property
+    def primary(self):
+        return getattr(settings, 'MOSQL_PRIMARY_DATABASE', DEFAULT_DB_ALIAS)
+
+    @property
+    def replicas(self):
+        return list(getattr(settings, 'MOSQL_REPLICA_DATABASES', ()))
+
+    def db_for_read(self, model, **hints):
+        if self.is_pinned():
+            return self.primary
+        replicas = [r for r in self.replicas if not self._is_skipped(r)]
+        while replicas:
+            # Only the chosen replica is connected to.
+            alias = self.choose_replica(replicas)
+            if self.is_available(alias):
+                return alias
+            replicas.remove(alias)
+        return self.primary
+
+    def db_for_write(self, model, **hints):
+        self.pin()
+        return self.primary
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # All databases contain the same data.
+        return True
+
+    def pin(self):
+        """Route reads in the current context to the primary for a while."""
+        seconds = getattr(settings, 'MOSQL_PIN_SECONDS', 5)
+        _pinned_until.set(time.time() + seconds)
+
+    def is_pinned(self):
+        """Whether reads in the current context are pinned to the primary."""
+        until = _pinned_until.get()
+        return until is not None and time.time() < until
+
+    def choose_replica(self, replicas):
+        """Choose a replica to read from.
+
+        :param replicas: Aliases of available replicas.
+        """
+        with self._lock:
+            index = next(self._counter) % len(replicas)
+        balance = getattr(settings, 'MOSQL_REPLICA_BALANCE', 'round-robin')
+        if balance == 'least-outstanding':
+            # Break ties by round robin.
+            replicas = replicas[index:] + replicas[:index]
+            return min(replicas, key=get_outstanding_queries)
+        elif balance != 'round-robin':
+            raise ValueError('Invalid MOSQL_REPLICA_BALANCE {value!r}'.format(
+                value=balance
+            ))
+        return replicas[index]
+
+    def mark_unavailable(self, alias):
+        """Skip a replica for reads until it can be retried."""
+        seconds = getattr(settings, 'MOSQL_REPLICA_RETRY_SECONDS', 30)
+        with self._lock:
+            self._unavailable[alias] = time.time() + seconds
+
+    def _is_skipped(self, alias):
+        with self._lock:
+            until = self._unavailable.get(alias)
+            if until is None:
+                return False
+            if time.time() < until:
+                return True
+            del self._unavailable[alias]
+            return False
+
+    def _execute_failed(self, sender, alias, exception, **kwargs):
+        if alias in self.replicas and isinstance(
+                exception, (OperationalError, InterfaceError)):
+            self.mark_unavailable(alias)
+
+    def is_available(self, alias):
+        """Whether a replica can be read from.
+
+        The connection to the replica is established if needed. If that
+        fails, the replica is marked unavailable.
+        """
+        if self._is_skipped(alias):
+            return False
+        try:
+            connections[alias].ensure_connection()
+        except DatabaseError:
+            self.mark_unavailable(alias)
+            return False
+        return True
@@ -0,0 +1,298 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import collections
+import itertools
+import zlib
+
+from django.db.models import Model
+from django.utils import six
+
+from .db.handlers import get_engine_handler
+from .models import MoManager, MoQuerySet
+from .parallel import _get_ordering, iter_merged
+
+__all__ = ['ShardedMoManager', 'ShardedMoQuerySet']
+
+
+def _make_shard_func(shards):
+    """Make a function mapping shard key values to shards by stable hashing"""
+    def shard_func(value):
+        if not isinstance(value, six.integer_types):
+            value = zlib.crc32(six.text_type(value).encode('utf-8'))
+        return shards[value % len(shards)]
+    return shard_func
+
+
+def _offset_callback(callback, base):
+    """Make a progress callback reporting totals including earlier shards"""
+    return lambda count: callback(base + count)
+
+
+class ShardedMoQuerySet(MoQuerySet):
+    """A :class:`MoQuerySet` with rows partitioned across databases
+
+    A queryset filtering on the shard key with ``where()``, e.g.
+    ``where({'tenant_id': 42})``, is routed to the shard of the value. Other
+    querysets are scattered to all shards. Their results are merged by their
+    ``ORDER BY`` clause (with a streaming heap merge), and then sliced.
+    Querysets with a database selected explicitly, e.g. with ``db_manager()``,
+    are not scattered.
+
+    Merging ordered results requires rows to be model instances or mappings
+    containing the ordering columns, i.e. querysets created by
+    :meth:`values_list` cannot be ordered across shards.
+    """
+    def __init__(self, model, extra_fields, using, shards=(), shard_key=None,
+                 shard_func=None):
+        """Initialize a :class:`ShardedMoQuerySet` object.
+
+        :param shards: Aliases of databases containing the shards.
+        :param shard_key: The column rows are partitioned by.
+        :param shard_func: A callable taking a value of the shard key, and
+            returning the alias of its shard.
+        """
+        super(ShardedMoQuerySet, self).__init__(model, extra_fields, using)
+        self.shards = tuple(shards)
+        self.shard_key = shard_key
+        self.shard_func = shard_func or _make_shard_func(self.shards)
+
+    def _clone(self):
+        clone = super(ShardedMoQuerySet, self)._clone()
+        clone.shards = self.shards
+        clone.shard_key = self.shard_key
+        clone.shard_func = self.shard_func
+        return clone
+
+    @property
+    def db(self):
+        return self._db or self.get_shard()
+
+    def get_shard(self):
+        """Get the alias of the shard the queryset is routed to.
+
+        :returns: The alias, or `None` if the queryset needs to be scattered to
+            all shards.
+        """
+        shards = set()
+        for key, value in self._params.where:
+            if (not isinstance(key, six.string_types)
+                    or key.rpartition('.')[2] != self.shard_key):
+                continue    # Not an equality condition on the shard key.
+            values = value if isinstance(value, tuple) else (value,)
+            shards.update(self.shard_func(v) for v in values)
+        if len(shards) == 1:
+            return shards.pop()
+        return None
+
+    def _get_shard_querysets(self):
+        """Get querysets executed on each shard to scatter the queryset
+
+        Slices are pushed down as limits, so that each shard selects enough
+        rows for the merged result to be sliced.
+        """
+        params = self._params
+        stop = None if params.limit is None else params.offset + params.limit
+        querysets = []
+        for alias in self.shards:
+            clone = self._clone()
+            clone._db = alias
+            clone._params = params._replace(offset=0, limit=stop)
+            querysets.append(clone)
+        return querysets
+
+    def _iter_scattered(self, chunk_size=2000):
+        results = [
+            qs.iterator(chunk_size) for qs in self._get_shard_querysets()
+        ]
+        ordering = _get_ordering(self)
+        if ordering:
+            rows = iter_merged(results, ordering)
+        else:
+            rows = itertools.chain.from_iterable(results)
+        params = self._params
+        stop = None if params.limit is None else params.offset + params.limit
+        return itertools.islice(rows, params.offset, stop)
+
+    def _fetch_all(self):
+        if self._result_cache is None and self.db is None:
+            self._result_cache = list(self._iter_scattered())
+        else:
+            super(ShardedMoQuerySet, self)._fetch_all()
+
+    def _prepare(self):
+        if self.db is not None:
+            super(ShardedMoQuerySet, self)._prepare()
+
+    def iterator(self, chunk_size=2000):
+        """Re-implemented from :class:`MoQuerySet`
+
+        Scattered querysets stream rows from all shards, merging them lazily.
+        """
+        if self.db is None:
+            return self._iter_scattered(chunk_size)
+        return super(ShardedMoQuerySet, self).iterator(chunk_size)
+
+    def count(self):
+        """Re-implemented from :class:`MoQuerySet`
+
+        Scattered querysets sum up counts of all shards, and then apply the
+        slice on the total. Aggregated (``GROUP BY``) querysets cannot be
+        counted across shards, since a group can exist on multiple shards.
+        """
+        if self._result_cache is not None or self.db is not None:
+            return super(ShardedMoQuerySet, self).count()
+        params = self._params
+        if params.group_by:
+            raise NotImplementedError(
+                'Cannot count an aggregated query across shards.'
+            )
+        unsliced = self._clone()
+        unsliced._params = params._replace(offset=0, limit=None)
+        total = sum(qs.count() for qs in unsliced._get_shard_querysets())
+        total = max(total - params.offset, 0)
+        if params.limit is not None:
+            total = min(total, params.limit)
+        return total
+
+    def exists(self):
+        """Re-implemented from :class:`MoQuerySet`"""
+        if self._result_cache is not None or self.db is not None:
+            return super(ShardedMoQuerySet, self).exists()
+        if self._params.offset or self._params.limit is not None:
+            return self.count() > 0
+        return any(qs.exists() for qs in self._get_shard_querysets())
+
+    def _submit_scattered(self, fn):
+        # The scattered method queries each shard itself, so it only needs a
+        # thread to run in.
+        return get_engine_handler(self.shards[0]).submit(fn)
+
+    def acount(self):
+        """Re-implemented from :class:`MoQuerySet`
+
+        Scattered querysets count rows of all shards in a thread.
+        """
+        if self._result_cache is not None or self.db is not None:
+            return super(ShardedMoQuerySet, self).acount()
+        return self._submit_scattered(self.count)
+
+    def aexists(self):
+        """Re-implemented from :class:`MoQuerySet`"""
+        if self._result_cache is not None or self.db is not None:
+            return super(ShardedMoQuerySet, self).aexists()
+        return self._submit_scattered(self.exists)
+
+    def _check_single_shard(self, action):
+        if self.db is None:
+            raise NotImplementedError(
+                'Cannot {action} a query across shards.'.format(action=action)
+            )
+
+    def copy_to(self, fileobj, format='csv'):
+        """Re-implemented from :class:`MoQuerySet`
+
+        Only querysets routed to a single shard can be copied.
+        """
+        self._check_single_shard('copy')
+        return super(ShardedMoQuerySet, self).copy_to(fileobj, format)
+
+    def explain(self, analyze=False, format='text'):
+        """Re-implemented from :class:`MoQuerySet`
+
+        Only querysets routed to a single shard can be explained.
+        """
+        self._check_single_shard('explain')
+        return super(ShardedMoQuerySet, self).explain(analyze, format)
+
+    def _check_scattered_write(self):
+        if self._params.offset or self._params.limit is not None:
+            raise NotImplementedError(
+                'Cannot modify a sliced query across shards.'
+            )
+
+    def delete(self, batch_size=None, callback=None):
+        """Re-implemented from :class:`MoQuerySet`
+
+        Scattered querysets delete rows on each shard.
+        """
+        if self.db is not None:
+            return super(ShardedMoQuerySet, self).delete(batch_size, callback)
+        self._check_scattered_write()
+        deleted = 0
+        for qs in self._get_shard_querysets():
+            shard_callback = None
+            if callback is not None:
+                shard_callback = _offset_callback(callback, deleted)
+            deleted += qs.delete(batch_size, shard_callback)
+        self._result_cache = None
+        return deleted
+
+    def update(self, mapping):
+        """Re-implemented from :class:`MoQuerySet`
+
+        Scattered querysets update rows on each shard.
+        """
+        if self.db is not None:
+            return super(ShardedMoQuerySet, self).update(mapping)
+        self._check_scattered_write()
+        updated = sum(qs.update(mapping) for qs in self._get_shard_querysets())
+        self._result_cache = None
+        return updated
+
+
+class ShardedMoManager(MoManager):
+    """A :class:`MoManager` for models partitioned across databases
+
+    Example::
+
+        class Order(models.Model):
+            tenant_id = models.IntegerField()
+            ...
+            objects = ShardedMoManager(['shard0', 'shard1'], 'tenant_id')
+
+    See :class:`ShardedMoQuerySet` for how queries are routed.
+    """
+    def __init__(self, shards, shard_key, shard_func=None):
+        """Initialize a :class:`ShardedMoManager` object.
+
+        :param shards: Aliases of databases containing the shards.
+        :param shard_key: The column rows are partitioned by.
+        :param shard_func: A callable taking a value of the shard key, and
+            returning the alias of its shard. By default values are hashed
+            into shards.
+        """
+        super(ShardedMoManager, self).__init__()
+        self.shards = tuple(shards)
+        self.shard_key = shard_key
+        self.shard_func = shard_func or _make_shard_func(self.shards)
+
+    def select(self, *extra_fields_as):
+        """Re-implemented from :class:`MoManager`"""
+        return ShardedMoQuerySet(
+            model=self.model,
+            extra_fields=extra_fields_as,
+            using=self._db,
+            shards=self.shards,
+            shard_key=self.shard_key,
+            shard_func=self.shard_func,
+        )
+
+    def bulk_insert(self, rows, **kwargs):
+        """Re-implemented from :class:`MoManager`
+
+        Rows are grouped by their shards, and inserted into each shard.
+        """
+        if self._db is not None:
+            return super(ShardedMoManager, self).bulk_insert(rows, **kwargs)
+        groups = collections.OrderedDict()
+        for row in rows:
+            if isinstance(row, Model):
+                value = getattr(row, self.shard_key)
+            else:
+                value = row[self.shard_key]
+            groups.setdefault(self.shard_func(value), []).append(row)
+        return sum(
+            self.db_manager(alias).bulk_insert(group, **kwargs)
+            for alias, group in groups.items()
+        )
@@ -0,0 +1,245 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+import collections
+import hashlib
+import re
+import threading
+import time
+
+from django.dispatch import Signal
+
+from .db.patch import placeholder
+
+__all__ = [
+    'pre_compile', 'post_compile', 'pre_execute', 'post_execute',
+    'execute_failed', 'fingerprint_sql', 'QueryStats', 'query_stats',
+]
+
+
+#: Sent before a ``SELECT`` query of a queryset is compiled. Compiled queries
+#: are memoized, so this is only sent on cache misses.
+pre_compile = Signal(providing_args=['queryset', 'alias', 'vendor'])
+
+#: Sent after a ``SELECT`` query of a queryset is compiled.
+post_compile = Signal(providing_args=[
+    'queryset', 'alias', 'vendor', 'sql', 'fingerprint', 'compile_time',
+])
+
+#: Sent before a query is executed. The sender is the model queried, or
+#: `None` if unknown.
+pre_execute = Signal(providing_args=['alias', 'vendor', 'sql', 'params'])
+
+#: Sent after a query is executed successfully. ``row_count`` is the number of
+#: rows fetched or affected, or -1 if unknown.
+post_execute = Signal(providing_args=[
+    'alias', 'vendor', 'sql', 'params', 'fingerprint', 'execute_time',
+    'row_count',
+])
+
+#: Sent when executing a query raises an exception.
+execute_failed = Signal(providing_args=[
+    'alias', 'vendor', 'sql', 'params', 'exception',
+])
+
+
+try:
+    _timer = time.perf_counter
+except AttributeError:      # Python 2
+    _timer = time.time
+
+_literal_patterns = [
+    (re.compile(r"'(?:[^']|'')*'"), '?'),                 # Strings
+    (re.compile(r'(?<![\w"`.])-?\d+(?:\.\d+)?\b'), '?'),    # Numbers
+    (re.compile(r'%%'), '%'),                             # Escaped %
+    (re.compile(r'%s|' + re.escape(placeholder)), '?'),   # Parameters
+    (re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)'), '(?+)'),  # Value lists
+    (re.compile(r'\s+'), ' '),
+]
+
+
+def fingerprint_sql(sql):
+    """Generate a stable fingerprint for the shape of a query
+
+    Literal values and parameter placeholders are stripped from the SQL, so
+    queries differing only in values share the same fingerprint. Lists of
+    values of any length are also considered the same.
+    """
+    normalized = sql
+    for pattern, replacement in _literal_patterns:
+        normalized = pattern.sub(replacement, normalized)
+    digest = hashlib.sha1(normalized.strip().encode('utf-8')).hexdigest()
+    return digest[:16]
+
+
+class compiling(object):
+    """Context manager to send signals around compiling a query
+
+    Set :attr:`sql` to the compiled SQL before exiting.
+    """
+    def __init__(self, queryset, alias, vendor):
+        self.queryset = queryset
+        self.alias = alias
+        self.vendor = vendor
+        self.sql = None
+
+    def __enter__(self):
+        if pre_compile.has_listeners():
+            pre_compile.send(
+                sender=self.queryset.model, queryset=self.queryset,
+                alias=self.alias, vendor=self.vendor,
+            )
+        self._start = _timer()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        elapsed = _timer() - self._start
+        if exc_type is None and post_compile.has_listeners():
+            post_compile.send(
+                sender=self.queryset.model, queryset=self.queryset,
+                alias=self.alias, vendor=self.vendor, sql=self.sql,
+                fingerprint=fingerprint_sql(self.sql), compile_time=elapsed,
+            )
+
+
+class executing(object):
+    """Context manager to send signals around executing a query
+
+    Set :attr:`row_count` before exiting if it is known. The time spent is
+    available as :attr:`execute_time` afterwards.
+    """
+    def __init__(self, alias, vendor, sql, params=None, model=None):
+        self.alias = alias
+        self.vendor = vendor
+        self.sql = sql
+        self.params = params
+        self.model = model
+        self.row_count = -1
+        self.execute_time = None
+
+    def __enter__(self):
+        if pre_execute.has_listeners():
+            pre_execute.send(
+                sender=self.model, alias=self.alias, vendor=self.vendor,
+                sql=self.sql, params=self.params,
+            )
+        self._start = _timer()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.execute_time = _timer() - self._start
+        if exc_type is None and post_execute.has_listeners():
+            post_execute.send(
+                sender=self.model, alias=self.alias, vendor=self.vendor,
+                sql=self.sql, params=self.params,
+                fingerprint=fingerprint_sql(self.sql),
+                execute_time=self.execute_time, row_count=self.row_count,
+            )
+        elif exc_type is not None and execute_failed.has_listeners():
+            execute_failed.send(
+                sender=self.model, alias=self.alias, vendor=self.vendor,
+                sql=self.sql, params=self.params, exception=exc_val,
+            )
+
+
+class QueryStats(object):
+    """Aggregates statistics of executed queries by their fingerprints
+
+    Call :meth:`connect` to start collecting. For each fingerprint, the
+    number of executions and compilations are counted, and latencies of the
+    most recent executions are kept to calculate percentiles.
+    """
+    def __init__(self, max_samples=1000):
+        """Initialize a :class:`QueryStats` object.
+
+        :param max_samples: Number of latencies kept for each fingerprint.
+        :type max_samples: `int`
+        """
+        super(QueryStats, self).__init__()
+        self.max_samples = max_samples
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return '<QueryStats: {count} fingerprints>'.format(
+            count=len(self._entries)
+        )
+
+    def connect(self):
+        """Start collecting statistics."""
+        post_compile.connect(self._record_compile)
+        post_execute.connect(self._record_execute)
+
+    def disconnect(self):
+        """Stop collecting statistics."""
+        post_compile.disconnect(self._record_compile)
+        post_execute.disconnect(self._record_execute)
+
+    def clear(self):
+        """Remove all collected statistics."""
+        with self._lock:
+            self._entries.clear()
+
+    def _get_entry(self, fingerprint, sql, alias):
+        try:
+            return self._entries[fingerprint]
+        except KeyError:
+            entry = self._entries[fingerprint] = {
+                'fingerprint': fingerprint, 'sql': sql, 'alias': alias,
+                'count': 0, 'rows': 0, 'total_time': 0.0,
+                'compile_count': 0, 'compile_time': 0.0,
+                'samples': collections.deque(maxlen=self.max_samples),
+            }
+            return entry
+
+    def _record_compile(self, sender, sql, fingerprint, compile_time, alias,
+                        **kwargs):
+        with self._lock:
+            entry = self._get_entry(fingerprint, sql, alias)
+            entry['compile_count'] += 1
+            entry['compile_time'] += compile_time
+
+    def _record_execute(self, sender, sql, fingerprint, execute_time,
+                        row_count, alias, **kwargs):
+        with self._lock:
+            entry = self._get_entry(fingerprint, sql, alias)
+            entry['count'] += 1
+            entry['total_time'] += execute_time
+            if row_count > 0:
+                entry['rows'] += row_count
+            entry['samples'].append(execute_time)
+
+    def summary(self, percentiles=(50, 95, 99)):
+        """Summarize collected statistics.
+
+        :param percentiles: Percentiles of execution latencies to calculate.
+        :returns: A list of dicts for each fingerprint, sorted by the total
+            execution time in descending order. Each contains
+            ``fingerprint``, ``sql`` (of the first query seen), ``alias``,
+            ``count``, ``rows``, ``total_time``, ``compile_count``,
+            ``compile_time``, and ``p<N>`` for each percentile.
+        """
+        with self._lock:
+            entries = [
+                dict(e, samples=list(e['samples']))
+                for e in self._entries.values()
+            ]
+        for entry in entries:
+            samples = sorted(entry.pop('samples'))
+            for p in percentiles:
+                entry['p{p}'.format(p=p)] = _percentile(samples, p)
+        entries.sort(key=lambda e: e['total_time'], reverse=True)
+        return entries
+
+
+def _percentile(samples, p):
+    """Calculate a percentile of sorted samples with the nearest-rank method"""
+    if not samples:
+        return None
+    rank = int(-(-len(samples) * p // 100))     # Ceiling division
+    return samples[max(rank, 1) - 1]
+
+
+#: A default :class:`QueryStats` instance for the process.
+query_stats = QueryStats()
@@ -1,22 +1,40 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import csv
+
 from django.utils import six
 
+from .db.patch import get_current_dialect
+
 
 class LazyString(object):
+    """A string generated by a function when it is used
 
+    The string is generated at most once for each dialect of the active
+    :class:`djangomosql.db.patch.Patcher`, so it can contain SQL generated by
+    MoSQL.
+    """
     __class__ = six.text_type
 
     def __init__(self, func):
         super(LazyString, self).__init__()
         self._func = func
+        self._rendered = {}
+
+    def _render(self):
+        dialect = get_current_dialect()
+        try:
+            return self._rendered[dialect]
+        except KeyError:
+            value = self._rendered[dialect] = self._func()
+            return value
 
     def __unicode__(self):
-        return self._func()
+        return self._render()
 
     def __str__(self):
-        return self._func()
+        return self._render()
 
     def __iter__(self):
         return iter(self.__class__(self))
@@ -32,3 +50,59 @@ class LazyString(object):
 
     def __add__(self, other):
         return self.__class__(self) + other
+
+
+def encode_csv_row(row):
+    """Prepare values of a row to be written by :mod:`csv`
+
+    The :mod:`csv` module of Python 2 only handles byte strings, so text is
+    encoded with UTF-8.
+    """
+    if six.PY2:
+        return [
+            v.encode('utf-8') if isinstance(v, six.text_type) else v
+            for v in row
+        ]
+    return row
+
+
+def decode_csv_row(row):
+    """Convert a row read by :mod:`csv` into values
+
+    Empty strings are converted to `None`, as PostgreSQL does for unquoted
+    empty values in CSV.
+    """
+    return [
+        None if v == '' else (v.decode('utf-8') if six.PY2 else v)
+        for v in row
+    ]
+
+
+class CSVStream(object):
+    """A file-like object that reads rows rendered as CSV
+
+    Rows are rendered lazily when read, so memory usage is bounded by the
+    requested read size regardless of the number of rows.
+    """
+    def __init__(self, rows):
+        super(CSVStream, self).__init__()
+        self._rows = iter(rows)
+        self._buffer = six.StringIO()
+        self._writer = csv.writer(self._buffer)
+        self._data = ''
+
+    def read(self, size=-1):
+        while size < 0 or len(self._data) < size:
+            try:
+                row = next(self._rows)
+            except StopIteration:
+                break
+            self._writer.writerow(encode_csv_row(row))
+            self._data += self._buffer.getvalue()
+            self._buffer.seek(0)
+            self._buffer.truncate()
+        if size < 0:
+            data, self._data = self._data, ''
+        else:
+            data, self._data = self._data[:size], self._data[size:]
+        return data
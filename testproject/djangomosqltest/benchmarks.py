@@ -0,0 +1,309 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Benchmarks of query building and execution
+
+Run them with ``python manage.py mosqlbench``. Each benchmark is set up
+against a generated dataset of a given size, and timed with
+:mod:`timeit`. Timings are reported in seconds per operation.
+"""
+
+from __future__ import division, unicode_literals
+import collections
+import platform
+import random
+import timeit
+
+import django
+import mosql
+from django.db import connections, transaction
+
+from djangomosql.functions import Min
+from .models import Department, Employee, FruitProduct
+
+
+FIRST_NAMES = ['Mosky', 'Keith', 'Tzu-ping', 'Andy', 'Liang', 'Ying']
+LAST_NAMES = ['Liu', 'Yang', 'Chung', 'Lin', 'Chen', 'Wang']
+FRUIT_KINDS = ['apple', 'cherry', 'orange', 'pear', 'banana', 'grape']
+
+INSERT_BATCH_SIZE = 10000
+
+# Benchmark name -> (setup function, number of operations per run).
+benchmarks = collections.OrderedDict()
+
+
+def benchmark(name, number=1):
+    """Register a benchmark
+
+    The decorated function takes a database alias and the size of the
+    dataset, and returns a callable performing ``number`` operations.
+    """
+    def decorator(func):
+        benchmarks[name] = (func, number)
+        return func
+    return decorator
+
+
+class _Rollback(Exception):
+    pass
+
+
+def _chunked(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _bulk_insert(manager, rows):
+    for chunk in _chunked(rows, INSERT_BATCH_SIZE):
+        manager.bulk_insert(chunk)
+
+
+def get_department_count(rows):
+    return max(rows // 100, 1)
+
+
+def populate(db, rows, seed=0):
+    """Replace data of test models with a generated dataset
+
+    ``rows`` employees and fruit products are generated, with an employee
+    in every hundred belonging to no department. The same ``seed`` always
+    generates the same data.
+    """
+    rng = random.Random(seed)
+    for model in (Employee, Department, FruitProduct):
+        model.objects.db_manager(db).select().delete()
+
+    departments = get_department_count(rows)
+    _bulk_insert(Department.objects.db_manager(db), (
+        {'id': i, 'name': 'Department {i}'.format(i=i)}
+        for i in range(1, departments + 1)
+    ))
+    _bulk_insert(Employee.objects.db_manager(db), (
+        {
+            'first_name': rng.choice(FIRST_NAMES),
+            'last_name': rng.choice(LAST_NAMES),
+            'department': None if i % 100 == 0 else (i % departments) + 1,
+        }
+        for i in range(rows)
+    ))
+    _bulk_insert(FruitProduct.objects.db_manager(db), (
+        {
+            'kind': rng.choice(FRUIT_KINDS),
+            'variety': 'v{i}'.format(i=i % 1000),
+            'price': round(rng.uniform(0.1, 10.0), 2),
+        }
+        for i in range(rows)
+    ))
+
+
+@benchmark('chain', number=1000)
+def bench_chain(db, rows):
+    manager = Employee.objects.db_manager(db)
+
+    def run():
+        for i in range(1000):
+            (manager.select()
+                    .where({'department_id': i})
+                    .order_by('-id')[10:20])
+    return run
+
+
+@benchmark('compile', number=1000)
+def bench_compile(db, rows):
+    queryset = (
+        Employee.objects.db_manager(db)
+                .select(('d.name', 'department_name'))
+                .join(Department, 'd', on={'department_id': 'd.id'})
+                .where({'first_name': 'Mosky', 'd.id': (1, 2, 3)})
+                .order_by('-id')[10:20]
+    )
+
+    def run():
+        # Clones do not share the memoized query.
+        for _ in range(1000):
+            queryset._clone()._get_select_query()
+    return run
+
+
+@benchmark('iterate')
+def bench_iterate(db, rows):
+    queryset = Employee.objects.db_manager(db).select()
+
+    def run():
+        list(queryset._clone())
+    return run
+
+
+@benchmark('iterator')
+def bench_iterator(db, rows):
+    queryset = Employee.objects.db_manager(db).select()
+
+    def run():
+        for _ in queryset.iterator():
+            pass
+    return run
+
+
+@benchmark('values')
+def bench_values(db, rows):
+    queryset = Employee.objects.db_manager(db).select().values()
+
+    def run():
+        list(queryset._clone())
+    return run
+
+
+@benchmark('count', number=10)
+def bench_count(db, rows):
+    queryset = Employee.objects.db_manager(db).select()
+
+    def run():
+        for _ in range(10):
+            queryset.count()
+    return run
+
+
+@benchmark('slice', number=10)
+def bench_slice(db, rows):
+    queryset = Employee.objects.db_manager(db).select().order_by('id')
+    offset = rows // 2
+
+    def run():
+        for _ in range(10):
+            list(queryset[offset:offset + 100])
+    return run
+
+
+@benchmark('delete')
+def bench_delete(db, rows):
+    departments = get_department_count(rows)
+    queryset = Employee.objects.db_manager(db).select().where({
+        'department_id': tuple(range(1, departments // 2 + 2)),
+    })
+
+    def run():
+        # Deleted rows are restored by rolling back.
+        try:
+            with transaction.atomic(using=db):
+                queryset.delete()
+                raise _Rollback
+        except _Rollback:
+            pass
+    return run
+
+
+@benchmark('join')
+def bench_join(db, rows):
+    queryset = (
+        Employee.objects.db_manager(db)
+                .select(('d.name', 'department_name'))
+                .join(Department, 'd', on={'department_id': 'd.id'})
+    )
+
+    def run():
+        list(queryset._clone())
+    return run
+
+
+@benchmark('aggregate', number=10)
+def bench_aggregate(db, rows):
+    queryset = (
+        FruitProduct.objects.db_manager(db)
+                    .select((Min('price'), 'minprice'))
+                    .as_('f')
+                    .group_by('f.kind')
+                    .order_by('minprice')
+    )
+
+    def run():
+        for _ in range(10):
+            list(queryset._clone())
+    return run
+
+
+def get_environment(db):
+    """Describe the environment benchmarks are run in."""
+    connection = connections[db]
+    return {
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'django': django.get_version(),
+        'mosql': getattr(mosql, '__version__', None),
+        'vendor': connection.vendor,
+    }
+
+
+def run_benchmarks(db, sizes, repeat=5, names=None):
+    """Run benchmarks against datasets of each size
+
+    :param db: Alias of the database to run benchmarks on. Existing data of
+        the test models in the database is replaced.
+    :param sizes: Numbers of rows in generated datasets.
+    :param repeat: Number of times each benchmark is timed.
+    :param names: Names of benchmarks to run. All are run if omitted.
+    :returns: A JSON-serializable report.
+    """
+    if names:
+        unknown = set(names) - set(benchmarks)
+        if unknown:
+            raise ValueError('Unknown benchmarks: {names}'.format(
+                names=', '.join(sorted(unknown))
+            ))
+    results = []
+    for rows in sizes:
+        populate(db, rows)
+        for name, (setup, number) in benchmarks.items():
+            if names and name not in names:
+                continue
+            run = setup(db, rows)
+            run()   # Warm up.
+            timings = sorted(
+                t / number
+                for t in timeit.Timer(run).repeat(repeat=repeat, number=1)
+            )
+            results.append({
+                'name': name,
+                'rows': rows,
+                'number': number,
+                'repeat': repeat,
+                'min': timings[0],
+                'median': timings[len(timings) // 2],
+                'mean': sum(timings) / len(timings),
+            })
+    return {'environment': get_environment(db), 'results': results}
+
+
+def compare(report, baseline, threshold=0.1):
+    """Compare results of a report against a baseline report
+
+    Median timings of benchmarks with the same name and dataset size are
+    compared. Benchmarks missing from the baseline are skipped.
+
+    :param threshold: A benchmark is considered regressed if it is slower
+        than the baseline by more than this ratio.
+    :returns: A list of dicts containing ``name``, ``rows``, ``median``,
+        ``baseline``, ``change`` (as a ratio), and ``regressed``.
+    """
+    baselines = {
+        (r['name'], r['rows']): r['median'] for r in baseline['results']
+    }
+    comparison = []
+    for result in report['results']:
+        key = (result['name'], result['rows'])
+        if not baselines.get(key):
+            continue
+        change = result['median'] / baselines[key] - 1
+        comparison.append({
+            'name': result['name'],
+            'rows': result['rows'],
+            'median': result['median'],
+            'baseline': baselines[key],
+            'change': change,
+            'regressed': change > threshold,
+        })
+    return comparison
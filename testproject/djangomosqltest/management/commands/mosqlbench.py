@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+import io
+import json
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test.utils import override_settings
+
+from ...benchmarks import benchmarks, compare, run_benchmarks
+
+
+def _split(value):
+    return [v.strip() for v in value.split(',') if v.strip()]
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmarks query building and execution on generated datasets, and '
+        'outputs the results as JSON. Benchmarks are run on a test database '
+        'created for the run. Available benchmarks: {names}.'
+    ).format(names=', '.join(benchmarks))
+
+    option_list = BaseCommand.option_list + (
+        make_option(
+            '--database', default=DEFAULT_DB_ALIAS,
+            help='Database to create the test database on.',
+        ),
+        make_option(
+            '--rows', default='1000,10000',
+            help='Comma-separated dataset sizes. Defaults to "1000,10000".',
+        ),
+        make_option(
+            '--repeat', type='int', default=5,
+            help='Number of times each benchmark is timed.',
+        ),
+        make_option(
+            '--bench', default='',
+            help='Comma-separated names of benchmarks to run.',
+        ),
+        make_option(
+            '--output', default=None,
+            help='File to write the JSON report to, instead of stdout.',
+        ),
+        make_option(
+            '--baseline', default=None,
+            help='A previous JSON report to compare the results against. '
+                 'Fails if any benchmark regressed.',
+        ),
+        make_option(
+            '--threshold', type='float', default=0.1,
+            help='Ratio a benchmark can be slower than the baseline by '
+                 'before it is considered regressed. Defaults to 0.1.',
+        ),
+    )
+
+    def handle(self, *args, **options):
+        try:
+            sizes = [int(v) for v in _split(options['rows'])]
+        except ValueError:
+            raise CommandError('--rows should be comma-separated integers')
+        baseline = None
+        if options['baseline']:
+            with io.open(options['baseline'], encoding='utf-8') as f:
+                baseline = json.load(f)
+
+        connection = connections[options['database']]
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            # Queries need to be compiled each time to be measured.
+            with override_settings(MOSQL_QUERY_CACHE_SIZE=0):
+                report = run_benchmarks(
+                    connection.alias, sizes, repeat=options['repeat'],
+                    names=_split(options['bench']),
+                )
+        except ValueError as e:
+            raise CommandError(e)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        regressed = []
+        if baseline is not None:
+            report['comparison'] = compare(
+                report, baseline, options['threshold']
+            )
+            regressed = [c for c in report['comparison'] if c['regressed']]
+
+        output = json.dumps(
+            report, indent=2, separators=(',', ': '), sort_keys=True
+        )
+        if options['output']:
+            with io.open(options['output'], 'w', encoding='utf-8') as f:
+                f.write(output + '\n')
+        else:
+            self.stdout.write(output)
+
+        if regressed:
+            raise CommandError(
+                '{count} benchmark(s) regressed by more than {ratio:.0%}: '
+                '{names}'.format(
+                    count=len(regressed), ratio=options['threshold'],
+                    names=', '.join(
+                        '{name} ({rows} rows, {change:+.1%})'.format(**c)
+                        for c in regressed
+                    ),
+                )
+            )
@@ -1,20 +1,55 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import gc
+import logging
+import threading
+import weakref
+from unittest import skipIf
+
 from django.conf import settings
-from django.db import connections
+from django.core.signals import request_started
+from django.db import (
+    DatabaseError, IntegrityError, OperationalError, connections
+)
+from django.test import TestCase, TransactionTestCase
 from django.utils import six
-from django.test import TestCase
+from django.test.utils import override_settings
+from mosql.func import _make_simple_function
+from mosql.util import identifier, raw
 from nose.tools import (
-    ok_, eq_, assert_not_equal, assert_true, assert_false, assert_raises,
+    ok_, eq_, assert_not_equal, assert_false, assert_raises,
     assert_is_none
 )
-from djangomosql.functions import Min
-from djangomosql.utils import LazyString
-from djangomosql.db.handlers import get_engine_handler
+from djangomosql.functions import Count, LazyValueGenerator, Min
+from djangomosql.utils import CSVStream, LazyString
+from djangomosql.db.executors import futures
+from djangomosql.db.cache import QueryCache, get_query_cache
+from djangomosql.db.handlers import (
+    EngineHandler, get_engine_handler, register_handler, handler_classes,
+    track_query
+)
+from djangomosql.db.query import ChunkedRawQuery
+from djangomosql.db.patch import Patcher, get_current_dialect, patch_map
+from djangomosql.paginator import KeysetPaginator
+from djangomosql.parallel import gather, merge_sorted
+from djangomosql.routers import ReplicaRouter
+from djangomosql.sharding import ShardedMoManager
+from djangomosql.signals import (
+    QueryStats, fingerprint_sql, post_compile, post_execute, pre_execute
+)
+from .benchmarks import benchmarks, compare, run_benchmarks
 from .models import Employee, Department, FruitProduct
 
 
+class CustomHandler(EngineHandler):
+    pass
+
+
+class Upper(LazyValueGenerator):
+    function = staticmethod(_make_simple_function('upper'))
+
+
 class BasicTests(TestCase):
     def test_lazy_string(self):
         text = 'lorem ipsum'
@@ -27,6 +62,207 @@ class BasicTests(TestCase):
             eq_(c1, c2)
         eq_(lazystr.capitalize(), 'Lorem ipsum')
 
+    def test_lazy_string_memoized(self):
+        calls = []
+
+        def render():
+            calls.append(get_current_dialect())
+            return identifier('a')
+
+        lazystr = LazyString(render)
+        eq_(len(lazystr), 3)
+        eq_(lazystr[1], 'a')
+        with Patcher(patch_map['mysql'], 'mysql'):
+            eq_(six.text_type(lazystr), '`a`')
+            eq_(lazystr[0], '`')
+        eq_(six.text_type(lazystr), '"a"')
+        eq_(calls, [None, 'mysql'])
+
+    def test_function(self):
+        func = Min('price')
+        ok_(not isinstance(func, six.string_types))
+        eq_(func.resolve(), 'MIN("price")')
+        ok_(isinstance(func.resolve(), raw))
+        ok_(func.resolve() is func.resolve())
+        with Patcher(patch_map['mysql'], 'mysql'):
+            eq_(func.resolve(), 'MIN(`price`)')
+        eq_(six.text_type(func), 'MIN("price")')
+        eq_(func, Min('price'))
+        eq_(hash(func), hash(Min('price')))
+        assert_not_equal(func, Count('price'))
+        assert_not_equal(func, Min('kind'))
+
+        # Concatenated expressions are lazy as well.
+        expr = func + ' AS x'
+        eq_(expr.resolve(), 'MIN("price") AS x')
+        eq_(('-' + func).resolve(), '-MIN("price")')
+        with Patcher(patch_map['mysql'], 'mysql'):
+            eq_(expr.resolve(), 'MIN(`price`) AS x')
+        ok_(func.startswith('MIN('))
+
+    def test_csv_stream(self):
+        stream = CSVStream([(1, 'a,b'), (2, None)])
+        eq_(stream.read(3), '1,"')
+        eq_(stream.read(), 'a,b"\r\n2,\r\n')
+        eq_(stream.read(10), '')
+
+    def test_fingerprint_sql(self):
+        eq_(fingerprint_sql("SELECT * FROM t1 WHERE a = 'x' AND b = 1"),
+            fingerprint_sql("SELECT *  FROM t1 WHERE a = 'it''s' AND b = 42"))
+        eq_(fingerprint_sql('SELECT * FROM "t" WHERE "id" IN (1, 2, 3)'),
+            fingerprint_sql('SELECT * FROM "t" WHERE "id" IN (%s)'))
+        assert_not_equal(fingerprint_sql('SELECT * FROM t1 LIMIT 1'),
+                         fingerprint_sql('SELECT * FROM t2 LIMIT 1'))
+
+    def test_merge_sorted(self):
+        results = [
+            [{'a': 1, 'b': 3}, {'a': 2, 'b': 9}],
+            [{'a': 1, 'b': 5}, {'a': 1, 'b': 2}, {'a': 3, 'b': 0}],
+            [],
+        ]
+        merged = merge_sorted(results, [('a', False), ('b', True)])
+        eq_([(r['a'], r['b']) for r in merged],
+            [(1, 5), (1, 3), (1, 2), (2, 9), (3, 0)])
+
+    def test_patcher(self):
+        eq_(identifier('a'), '"a"')
+        with Patcher(patch_map['mysql']):
+            eq_(identifier('a'), '`a`')
+            with Patcher({}):
+                eq_(identifier('a'), '"a"')
+            eq_(identifier('a'), '`a`')
+        eq_(identifier('a'), '"a"')
+
+        patcher = Patcher({})
+        with Patcher(patch_map['mysql'], 'mysql'):
+            eq_(get_current_dialect(), 'mysql')
+            with patcher:
+                ok_(get_current_dialect() is patcher)
+            eq_(get_current_dialect(), 'mysql')
+        assert_is_none(get_current_dialect())
+
+        with assert_raises(ValueError):
+            Patcher({'select': None})
+
+    def test_patcher_threads(self):
+        entered = threading.Event()
+        checked = threading.Event()
+        results = []
+
+        def generate():
+            with Patcher(patch_map['mysql']):
+                entered.set()
+                checked.wait(5)
+                results.append(identifier('a'))
+
+        thread = threading.Thread(target=generate)
+        thread.start()
+        entered.wait(5)
+        # The other thread is inside a patcher; this one should not be.
+        eq_(identifier('a'), '"a"')
+        checked.set()
+        thread.join()
+        eq_(results, ['`a`'])
+
+
+@override_settings(
+    MOSQL_PRIMARY_DATABASE='primary', MOSQL_REPLICA_DATABASES=['default']
+)
+class ReplicaRouterTests(TestCase):
+    def setUp(self):
+        self.router = ReplicaRouter()
+        request_started.send(sender=None)
+
+    def test_pin_after_write(self):
+        eq_(self.router.db_for_read(Employee), 'default')
+        eq_(self.router.db_for_write(Employee), 'primary')
+        eq_(self.router.db_for_read(Employee), 'primary')
+        request_started.send(sender=None)
+        eq_(self.router.db_for_read(Employee), 'default')
+        with override_settings(MOSQL_PIN_SECONDS=0):
+            self.router.db_for_write(Employee)
+            eq_(self.router.db_for_read(Employee), 'default')
+
+    def test_failover(self):
+        self.router.mark_unavailable('default')
+        eq_(self.router.db_for_read(Employee), 'primary')
+        with override_settings(MOSQL_REPLICA_RETRY_SECONDS=0):
+            self.router.mark_unavailable('default')
+            eq_(self.router.db_for_read(Employee), 'default')
+
+    def test_balance(self):
+        replicas = ['a', 'b', 'c']
+        chosen = [self.router.choose_replica(replicas) for _ in range(6)]
+        eq_(chosen[:3], chosen[3:])
+        eq_(sorted(chosen[:3]), replicas)
+        with override_settings(MOSQL_REPLICA_BALANCE='least-outstanding'):
+            with track_query('a'), track_query('c'):
+                for _ in range(3):
+                    eq_(self.router.choose_replica(replicas), 'b')
+        with override_settings(MOSQL_REPLICA_BALANCE='random'):
+            with assert_raises(ValueError):
+                self.router.choose_replica(replicas)
+
+    @override_settings(MOSQL_REPLICA_DATABASES=['a', 'b', 'c'])
+    def test_check_chosen_replica(self):
+        checked = []
+
+        def is_available(alias):
+            checked.append(alias)
+            if alias == 'a':
+                self.router.mark_unavailable(alias)
+                return False
+            return True
+
+        self.router.is_available = is_available
+        chosen = [self.router.db_for_read(Employee) for _ in range(3)]
+        # Each read connects to one replica, unless it is unavailable.
+        eq_(len(checked), 4)
+        eq_(checked.count('a'), 1)
+        ok_('a' not in chosen)
+
+    def test_failover_on_execute(self):
+        handler = get_engine_handler('default')
+        with assert_raises(IntegrityError):
+            with handler.executing('SELECT 1'):
+                raise IntegrityError('Not a connection error')
+        eq_(self.router.db_for_read(Employee), 'default')
+        with assert_raises(OperationalError):
+            with handler.executing('SELECT 1'):
+                raise OperationalError('Connection lost')
+        eq_(self.router.db_for_read(Employee), 'primary')
+
+
+class CountingRouter(object):
+    def __init__(self):
+        self.reads = 0
+
+    def db_for_read(self, model, **hints):
+        self.reads += 1
+        return 'default'
+
+
+class RoutingTests(TestCase):
+    def setUp(self):
+        Employee.objects.create(first_name='Mosky', last_name='Liu')
+        self.router = CountingRouter()
+
+    def assert_routed_once(self, func):
+        self.router.reads = 0
+        with override_settings(DATABASE_ROUTERS=[self.router]):
+            result = func()
+        eq_(self.router.reads, 1)
+        return result
+
+    def test_evaluate(self):
+        select = Employee.objects.select
+        employees = self.assert_routed_once(lambda: list(select()))
+        eq_(employees[0]._state.db, 'default')
+        self.assert_routed_once(lambda: list(select().iterator()))
+        self.assert_routed_once(lambda: list(select().values()))
+        eq_(self.assert_routed_once(select().count), 1)
+        ok_(self.assert_routed_once(select().exists))
+
 
 class ReprTests(TestCase):
 
@@ -50,6 +286,255 @@ class ReprTests(TestCase):
             ))
 
 
+class BenchmarkTests(TestCase):
+
+    def test_run(self):
+        report = run_benchmarks('default', [30], repeat=1)
+        eq_([r['name'] for r in report['results']], list(benchmarks))
+        for result in report['results']:
+            eq_(result['rows'], 30)
+            ok_(0 <= result['min'] <= result['median'])
+        eq_(Employee.objects.count(), 30)
+        eq_(Department.objects.count(), 1)
+
+        report = run_benchmarks('default', [200], names=['count', 'delete'])
+        eq_([r['name'] for r in report['results']], ['count', 'delete'])
+        eq_(Employee.objects.count(), 200)
+        with assert_raises(ValueError):
+            run_benchmarks('default', [10], names=['nonexistent'])
+
+    def test_compare(self):
+        def make_report(**medians):
+            return {'results': [
+                {'name': name, 'rows': 10, 'median': median}
+                for name, median in sorted(medians.items())
+            ]}
+
+        comparison = compare(
+            make_report(count=1.5, join=1.0, slice=2.0),
+            make_report(count=1.0, join=1.0),
+            threshold=0.2,
+        )
+        eq_([(c['name'], c['regressed']) for c in comparison],
+            [('count', True), ('join', False)])
+        eq_(comparison[0]['change'], 0.5)
+
+
+class HandlerTests(TestCase):
+
+    def test_cache(self):
+        for db in settings.DATABASES:
+            handler = get_engine_handler(db)
+            ok_(handler is get_engine_handler(db))
+            ok_(handler.connection is connections[db])
+        ok_(get_engine_handler() is get_engine_handler('default'))
+
+    def test_setting(self):
+        handler = get_engine_handler('default')
+        path = 'djangomosqltest.tests.CustomHandler'
+        with override_settings(MOSQL_ENGINE_HANDLERS={'sqlite': path}):
+            ok_(isinstance(get_engine_handler('default'), CustomHandler))
+        assert_false(get_engine_handler('default') is handler)
+        assert_false(isinstance(get_engine_handler('default'), CustomHandler))
+
+    def test_register(self):
+        original = handler_classes['sqlite']
+        register_handler('sqlite', CustomHandler)
+        try:
+            ok_(isinstance(get_engine_handler('default'), CustomHandler))
+        finally:
+            register_handler('sqlite', original)
+        ok_(isinstance(get_engine_handler('default'), original))
+
+    def test_batch_delete_query(self):
+        connection = connections['default']
+        expect = 'DELETE FROM "t" WHERE "id" IN (1, 2)'
+        for vendor in ('postgresql', 'sqlite', 'mysql'):
+            handler = handler_classes[vendor](connection, vendor)
+            if vendor == 'mysql':
+                expect = expect.replace('"', '`')
+            eq_(handler.get_batch_delete_query('t', 'id', [1, 2]), expect)
+
+    def test_explain_query(self):
+        connection = connections['default']
+        sql = 'SELECT 1'
+
+        handler = handler_classes['postgresql'](connection, 'postgresql')
+        eq_(handler.get_explain_query(sql), 'EXPLAIN (FORMAT TEXT) SELECT 1')
+        eq_(handler.get_explain_query(sql, analyze=True, format='json'),
+            'EXPLAIN (ANALYZE, FORMAT JSON) SELECT 1')
+
+        handler = handler_classes['mysql'](connection, 'mysql')
+        eq_(handler.get_explain_query(sql), 'EXPLAIN SELECT 1')
+        eq_(handler.get_explain_query(sql, format='json'),
+            'EXPLAIN FORMAT=JSON SELECT 1')
+        eq_(handler.get_explain_query(sql, analyze=True),
+            'EXPLAIN ANALYZE SELECT 1')
+        with assert_raises(ValueError):
+            handler.get_explain_query(sql, analyze=True, format='json')
+
+        handler = handler_classes['sqlite'](connection, 'sqlite')
+        eq_(handler.get_explain_query(sql), 'EXPLAIN QUERY PLAN SELECT 1')
+        with assert_raises(ValueError):
+            handler.get_explain_query(sql, analyze=True)
+
+
+class QueryCacheTests(TestCase):
+
+    def test_lru(self):
+        cache = QueryCache(2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        eq_(cache.get('a'), 1)
+        cache.set('c', 3)
+        assert_is_none(cache.get('b'))
+        eq_(cache.get('c'), 3)
+        eq_(cache.stats(), {'hits': 2, 'misses': 1, 'size': 2, 'maxsize': 2})
+
+    def test_memoize(self):
+        people = Employee.objects.select().where({'first_name': 'Mosky'})
+        eq_(people._query_cache, {})
+        query = people.query
+        ok_(people.query is query)
+        eq_(list(people._query_cache.values()), [(query, ())])
+        assert_false(people.where({'last_name': 'Liu'}).query is query)
+
+    def test_process_wide(self):
+        assert_is_none(get_query_cache())
+        with override_settings(MOSQL_QUERY_CACHE_SIZE=10):
+            cache = get_query_cache()
+            eq_(cache.maxsize, 10)
+            for name in ('Mosky', 'Mosky', 'Keith'):
+                Employee.objects.select().where({'first_name': name}).query
+            eq_(cache.stats()['hits'], 1)
+            eq_(cache.stats()['misses'], 2)
+
+            # Unhashable parameters are not cached.
+            Employee.objects.select().where({'id': set([1, 2])}).query
+            eq_(cache.stats()['size'], 2)
+        assert_is_none(get_query_cache())
+
+    def test_subquery(self):
+        def join_subquery():
+            inner = Department.objects.select().where({'name': 'Sales'})
+            outer = Employee.objects.select().join(
+                inner, 'd', on={'department_id': 'd.id'}
+            )
+            return outer, weakref.ref(inner)
+
+        with override_settings(MOSQL_QUERY_CACHE_SIZE=10):
+            cache = get_query_cache()
+            query = join_subquery()[0].query
+            outer, inner_ref = join_subquery()
+            eq_(outer.query, query)
+            eq_(cache.stats()['hits'], 1)
+            # The cache does not keep the subquery alive.
+            del outer
+            gc.collect()
+            assert_is_none(inner_ref())
+
+
+class ParameterizedQueryTests(TestCase):
+
+    fixtures = ['fruits']
+    multi_db = True
+
+    def test_select_query(self):
+        for db in settings.DATABASES:
+            m = FruitProduct.objects.db_manager(db)
+            inner = m.select().as_('fi').where({'fi.kind': 'apple'})
+            products = m.select().as_('f').join(
+                inner, 'x', on={'f.id': 'x.id'}
+            ).where({'f.price >': 1})[1:]
+            sql, params = products._get_select_query(parameterize=True)
+            expect = (
+                'SELECT "f".* FROM "djangomosqltest_fruitproduct" AS "f" '
+                'INNER JOIN (SELECT "fi".* FROM "djangomosqltest_fruitproduct"'
+                ' AS "fi" WHERE "fi"."kind" = %s) AS "x"'
+                ' ON "f"."id" = "x"."id"'
+                ' WHERE "f"."price" > %s LIMIT {limit} OFFSET 1'
+            ).format(limit=get_engine_handler(db).no_limit_value())
+            if db == 'mysql':
+                expect = expect.replace('"', '`')
+            eq_(sql, expect)
+            eq_(params, ('apple', 1))
+            ok_('\'apple\'' in products.query)
+
+            # Literal percent signs are escaped for the cursor.
+            gala = m.select().where({
+                'variety LIKE': raw("'%ala'"), 'kind': 'apple',
+            })
+            sql, params = gala._get_select_query(parameterize=True)
+            ok_(' LIKE \'%%ala\'' in sql)
+            ok_(' = %s' in sql)
+            eq_(params, ('apple',))
+
+    def test_execute(self):
+        for db in settings.DATABASES:
+            products = FruitProduct.objects.db_manager(db).select()
+            for parameterized in (False, True):
+                with override_settings(
+                        MOSQL_PARAMETERIZED_QUERIES=parameterized):
+                    apples = products.where({'kind': 'apple'}).order_by('pk')
+                    eq_(apples.count(), 3)
+                    eq_([p.variety for p in apples.iterator()],
+                        ['gala', 'fuji', 'limbertwig'])
+                    eq_(apples[1].variety, 'fuji')
+                    # Percent signs must survive both modes.
+                    eq_(products.where({'variety like': '%s'}).count(), 0)
+                    eq_(products.where({'variety like': '%ala'}).count(), 1)
+                    gala = products.where({'variety LIKE': raw("'%ala'")})
+                    eq_(gala.count(), 1)
+                    eq_([p.variety for p in gala], ['gala'])
+                    eq_(list(gala.values_list('variety', flat=True)),
+                        ['gala'])
+                    # Keyset conditions follow the WHERE clause.
+                    cheap = products.where({'kind': 'apple'}).order_by(
+                        'price'
+                    )
+                    page = cheap.paginate_after((0.1, 0), 2)
+                    eq_([p.variety for p in page], ['fuji', 'gala'])
+                    eq_([p.variety for p in cheap.paginate_after(page[1])],
+                        ['limbertwig'])
+
+            with override_settings(MOSQL_PARAMETERIZED_QUERIES=True):
+                eq_(products.where({'kind': 'apple'}).delete(batch_size=1), 3)
+                eq_(products.where({'kind': 'pear'}).delete(), 2)
+                eq_(products.as_('f').where({'f.kind': 'cherry'}).delete(), 2)
+            eq_(products.count(), 2)
+
+    def test_write_functions(self):
+        for db in settings.DATABASES:
+            products = FruitProduct.objects.db_manager(db).select()
+            for parameterized, kind, count in ((False, 'apple', 3),
+                                               (True, 'pear', 2)):
+                with override_settings(
+                        MOSQL_PARAMETERIZED_QUERIES=parameterized):
+                    eq_(products.where({'kind': kind}).update({
+                        'variety': Upper('variety'),
+                    }), count)
+                    eq_(products.where({'kind': kind}).update([
+                        ('variety', Upper('variety')),
+                    ]), count)
+                    upper = products.where({
+                        'kind': kind, 'variety': Upper('variety'),
+                    })
+                    eq_(upper.count(), count)
+                    eq_(upper.delete(), count)
+
+    def test_update_subquery(self):
+        for db in settings.DATABASES:
+            products = FruitProduct.objects.db_manager(db).select()
+            apples = products.as_('f').where({'f.kind': 'apple'})
+            with override_settings(MOSQL_PARAMETERIZED_QUERIES=True):
+                eq_(apples.update({'variety': 'zz'}), 3)
+                eq_(apples.order_by('f.price')[:1].update({
+                    'variety': 'cheap',
+                }), 1)
+            eq_(sorted(apples.values_list('variety', flat=True)),
+                ['cheap', 'zz', 'zz'])
+
+
 class EmployeeMoSQLTests(TestCase):
 
     fixtures = ['employees']
@@ -63,17 +548,237 @@ class EmployeeMoSQLTests(TestCase):
         people = Employee.objects.select().where({'first_name': 'Mosky'})
         clone = people._clone()
         eq_(dir(clone), dir(people))
-        eq_(clone._params.keys(), people._params.keys())
-
-        tested = False
-        for k in people._params:
-            eq_(people._params[k], clone._params[k])
-            if (not isinstance(people._params[k],
-                               (six.integer_types, six.string_types))
-                    and people._params[k] is not None):
-                assert_false(people._params[k] is clone._params[k])
-                tested = True
-        assert_true(tested)
+        # State is immutable, and therefore shared between clones.
+        ok_(clone._params is people._params)
+        ok_(clone.extra_fields is people.extra_fields)
+        assert_raises(AttributeError, setattr, clone._params, 'limit', 1)
+
+        filtered = people.where({'last_name': 'Liu', 'first_name': 'Andy'})
+        eq_(people._params.where, (('first_name', 'Mosky'),))
+        eq_(filtered._params.where[0], ('first_name', 'Andy'))
+        eq_(filtered._params.joins, people._params.joins)
+
+    def test_result_cache(self):
+        for db in settings.DATABASES:
+            people = Employee.objects.db_manager(db).select().order_by('id')
+            with self.assertNumQueries(1, using=db):
+                eq_(len(people), 2)
+                ok_(people)
+                eq_([p.first_name for p in people], ['Mosky', 'Keith'])
+                eq_(people.count(), 2)
+                eq_(people[1].first_name, 'Keith')
+            with assert_raises(IndexError):
+                people[2]
+
+            clone = people.where({'first_name': 'Keith'})
+            assert_is_none(clone._result_cache)
+            with self.assertNumQueries(1, using=db):
+                eq_(len(clone), 1)
+
+    def test_iterator(self):
+        for db in settings.DATABASES:
+            people = Employee.objects.db_manager(db).select().order_by('id')
+            for chunk_size in (1, 2, 100):
+                eq_([p.first_name for p in people.iterator(chunk_size)],
+                    ['Mosky', 'Keith'])
+            assert_is_none(people._result_cache)
+            eq_(list(people.where({'id': 0}).iterator()), [])
+
+    def test_iterator_closes_cursor(self):
+        sql = Employee.objects.select().order_by('id').query
+        for chunk_size in (1, 100):
+            # Exhausted.
+            query = ChunkedRawQuery(sql, 'default', chunk_size=chunk_size)
+            eq_(len(list(query)), 2)
+            with assert_raises(DatabaseError):
+                query.cursor.fetchone()
+            # Abandoned.
+            query = ChunkedRawQuery(sql, 'default', chunk_size=chunk_size)
+            rows = iter(query)
+            next(rows)
+            rows.close()
+            with assert_raises(DatabaseError):
+                query.cursor.fetchone()
+
+    def test_values(self):
+        for db in settings.DATABASES:
+            people = Employee.objects.db_manager(db).select().order_by('id')
+            eq_(list(people.values('first_name', 'department')), [
+                {'first_name': 'Mosky', 'department': None},
+                {'first_name': 'Keith', 'department': 1},
+            ])
+            eq_(people.values()[0], {
+                'id': 1, 'first_name': 'Mosky', 'last_name': 'Liu',
+                'department_id': None,
+            })
+            eq_(list(people.values('pk')), [{'pk': 1}, {'pk': 2}])
+            eq_(list(people.values_list('pk', flat=True)), [1, 2])
+
+            people = Employee.objects.db_manager(db).select(
+                ('d.name', 'department_name')
+            ).join(Department, 'd', on={'department_id': 'd.id'})
+            rows = people.values('id', 'department_name', 'd.id')
+            with self.assertNumQueries(1, using=db):
+                eq_(list(rows), [
+                    {'id': 2, 'department_name': 'Dev Team', 'd.id': 1},
+                ])
+                eq_(rows.count(), 1)
+
+    def test_values_list(self):
+        for db in settings.DATABASES:
+            people = Employee.objects.db_manager(db).select().order_by('id')
+            eq_(list(people.values_list('id', 'first_name')),
+                [(1, 'Mosky'), (2, 'Keith')])
+            eq_(list(people.values_list('first_name', flat=True)),
+                ['Mosky', 'Keith'])
+            eq_(list(people.values_list('id', flat=True).iterator(1)),
+                [1, 2])
+
+            row = people.values_list('id', 'first_name', named=True).first()
+            eq_((row.id, row.first_name), (1, 'Mosky'))
+
+            with assert_raises(TypeError):
+                people.values_list('id', 'first_name', flat=True)
+            with assert_raises(TypeError):
+                people.values_list('id', flat=True, named=True)
+
+    def test_copy_to(self):
+        for db in settings.DATABASES:
+            people = Employee.objects.db_manager(db).select().order_by('id')
+            fileobj = six.StringIO()
+            eq_(people.copy_to(fileobj), 2)
+            eq_(fileobj.getvalue().splitlines(), [
+                '1,Mosky,Liu,', '2,Keith,\xe6\xa5\x8a,1'
+                if six.PY2 else '2,Keith,\u694a,1',
+            ])
+            with assert_raises(ValueError):
+                people.copy_to(fileobj, format='xml')
+
+    def test_exists(self):
+        for db in settings.DATABASES:
+            people = Employee.objects.db_manager(db).select().order_by('id')
+            with self.assertNumQueries(4, using=db):
+                ok_(people.exists())
+                ok_(people)
+                assert_false(people.where({'id': 0}))
+                assert_false(people[2:].exists())
+            assert_is_none(people._result_cache)
+
+            query = get_engine_handler(db).get_exists_query(people)
+            expect = (
+                'SELECT 1 FROM "djangomosqltest_employee" LIMIT 1'
+            )
+            if db == 'mysql':
+                expect = expect.replace('"', '`')
+            eq_(query, expect)
+
+            list(people)
+            with self.assertNumQueries(0, using=db):
+                ok_(people.exists())
+
+    def test_signals(self):
+        events = []
+
+        def receiver(signal, sender, **kwargs):
+            events.append((signal, sender, kwargs))
+
+        for signal in (post_compile, pre_execute, post_execute):
+            signal.connect(receiver)
+        try:
+            for db in settings.DATABASES:
+                del events[:]
+                people = Employee.objects.db_manager(db).select()
+                eq_(len(people.where({'first_name': 'Mosky'})), 1)
+                eq_([e[0] for e in events],
+                    [post_compile, pre_execute, post_execute])
+                ok_(all(e[1] is Employee for e in events))
+                compiled, _, executed = [e[2] for e in events]
+                eq_(compiled['alias'], db)
+                eq_(compiled['sql'], executed['sql'])
+                eq_(compiled['fingerprint'], executed['fingerprint'])
+                eq_(executed['row_count'], 1)
+                ok_(executed['execute_time'] >= 0)
+
+                del events[:]
+                eq_(len(list(people.iterator())), 2)
+                eq_([e[0] for e in events],
+                    [post_compile, pre_execute, post_execute])
+                ok_(all(e[1] is Employee for e in events))
+        finally:
+            for signal in (post_compile, pre_execute, post_execute):
+                signal.disconnect(receiver)
+
+    def test_query_stats(self):
+        stats = QueryStats()
+        stats.connect()
+        try:
+            for db in settings.DATABASES:
+                stats.clear()
+                people = Employee.objects.db_manager(db).select()
+                for name in ('Mosky', 'Keith', 'Nobody'):
+                    list(people.where({'first_name': name}))
+                people.count()
+                summary = stats.summary()
+                fingerprint = fingerprint_sql(
+                    people.where({'first_name': 'Mosky'})._get_select_query()
+                )
+                entry = next(
+                    e for e in summary if e['fingerprint'] == fingerprint
+                )
+                eq_(entry['count'], 3)
+                eq_(entry['compile_count'], 3)
+                eq_(entry['rows'], 2)
+                eq_(entry['alias'], db)
+                ok_(entry['p50'] <= entry['p95'] <= entry['p99'])
+                ok_(summary[0]['total_time'] >= summary[1]['total_time'])
+        finally:
+            stats.disconnect()
+        count = sum(e['count'] for e in stats.summary())
+        people.count()
+        eq_(sum(e['count'] for e in stats.summary()), count)
+
+    def test_explain(self):
+        for db in settings.DATABASES:
+            people = (
+                Employee.objects.db_manager(db)
+                        .select(('d.name', 'department_name'))
+                        .join(Department, 'd', on={'department_id': 'd.id'})
+                        .where({'first_name': 'Mosky'})
+            )
+            ok_('djangomosqltest_employee' in people.explain())
+            ok_('djangomosqltest_employee' in people.values().explain())
+            ok_(isinstance(people.explain(format='json'), list))
+            with assert_raises(ValueError):
+                people.explain(format='xml')
+            assert_is_none(people._result_cache)
+
+    def test_slow_query(self):
+        records = []
+        handler = logging.Handler()
+        handler.emit = records.append
+        logger = logging.getLogger('djangomosql.slow_queries')
+        logger.addHandler(handler)
+        try:
+            for db in settings.DATABASES:
+                people = Employee.objects.db_manager(db).select()
+                with override_settings(MOSQL_SLOW_QUERY_SECONDS=60):
+                    list(people)
+                eq_(records, [])
+                with override_settings(MOSQL_SLOW_QUERY_SECONDS=0):
+                    people.where({'first_name': 'Mosky'}).update({
+                        'last_name': 'Liu',
+                    })
+                    list(people.where({'first_name': 'Mosky'}))
+                eq_(len(records), 2)
+                update, select = records
+                assert_is_none(update.plan)
+                eq_(select.sql, people.where({'first_name': 'Mosky'}).query)
+                eq_(select.alias, db)
+                ok_(select.duration >= 0)
+                ok_('djangomosqltest_employee' in select.plan)
+                del records[:]
+        finally:
+            logger.removeHandler(handler)
 
     def test_select(self):
         for db in settings.DATABASES:
@@ -140,6 +845,52 @@ class EmployeeMoSQLTests(TestCase):
                     ('d.name', 'department_name')
                 ).join(Employee(), 'd', on={'department_id': 'd.id'})
 
+    def test_join_hydrate(self):
+        for db in settings.DATABASES:
+            dev_team = Department.objects.db_manager(db).get(name='Dev Team')
+            people = (
+                Employee.objects.db_manager(db).select()
+                        .join(Department, 'd', hydrate='department')
+                        .order_by('id')
+            )
+            with self.assertNumQueries(1, using=db):
+                eq_([(p.first_name, p.department) for p in people],
+                    [('Mosky', None), ('Keith', dev_team)])
+            keith = people[1]
+            with self.assertNumQueries(0, using=db):
+                eq_(keith.department.name, 'Dev Team')
+                eq_(keith.department._state.db, db)
+                assert_false(keith.department._state.adding)
+                assert_false(hasattr(keith, 'department__name'))
+
+            people = (
+                Employee.objects.db_manager(db).select().as_('e')
+                        .join(Department, 'd', on={'e.department_id': 'd.id'},
+                              hydrate='department')
+            )
+            with self.assertNumQueries(1, using=db):
+                eq_([p.department.name for p in people.iterator()],
+                    ['Dev Team'])
+
+    def test_join_hydrate_invalid(self):
+        people = Employee.objects.select()
+        with assert_raises(ValueError):
+            people.join(Department, 'd', hydrate='first_name')
+        with assert_raises(ValueError):
+            people.join(Employee, 'e', hydrate='department')
+        with assert_raises(ValueError):
+            people.join('djangomosqltest_department', 'd',
+                        hydrate='department')
+        # Columns of hydrated models cannot be selected with GROUP BY.
+        with assert_raises(ValueError):
+            people.group_by('last_name').join(
+                Department, 'd', hydrate='department'
+            )
+        with assert_raises(ValueError):
+            people.join(Department, 'd', hydrate='department').group_by(
+                'last_name'
+            )
+
     def test_join_type(self):
         for db in settings.DATABASES:
             for join_type in ('INNER', 'CROSS', 'LEFT', 'RIGHT'):
@@ -186,6 +937,110 @@ class EmployeeMoSQLTests(TestCase):
             assert_is_none(neet.department)
 
 
+# Queries are executed in other threads, so data need to be committed, and
+# in-memory SQLite test databases need to be shared between threads.
+@skipIf(futures is None, 'concurrent.futures is not available')
+@skipIf(not all(
+    getattr(connections[db].features, 'can_share_in_memory_db', True)
+    for db in settings.DATABASES
+), 'Test databases cannot be shared between threads')
+class EmployeeMoSQLAsyncTests(TransactionTestCase):
+
+    fixtures = ['employees']
+    multi_db = True
+
+    def test_async(self):
+        for db in settings.DATABASES:
+            people = Employee.objects.db_manager(db).select().order_by('id')
+            eq_(people.acount().result(), 2)
+            ok_(people.aexists().result())
+            eq_(people.aget({'first_name': 'Keith'}).result().id, 2)
+            eq_([p.first_name for p in people.aiter().result()],
+                ['Mosky', 'Keith'])
+            with self.assertNumQueries(0, using=db):
+                eq_(people.acount().result(), 2)
+            with assert_raises(Employee.DoesNotExist):
+                people.aget({'id': 0}).result()
+
+    def test_gather(self):
+        for db in settings.DATABASES:
+            people = Employee.objects.db_manager(db).select()
+            querysets = [
+                people.where({'id': 1}).order_by('-first_name'),
+                people.where({'id': 2}).order_by('-first_name'),
+            ]
+            for max_workers in (None, 2):
+                results = gather(*querysets, max_workers=max_workers)
+                eq_([[p.first_name for p in r] for r in results],
+                    [['Mosky'], ['Keith']])
+
+            merged = gather(*querysets[::-1], merge=True)
+            eq_([p.first_name for p in merged], ['Mosky', 'Keith'])
+            merged = gather(*[
+                qs.values('first_name') for qs in querysets
+            ], merge=True, max_workers=1)
+            eq_(merged, [{'first_name': 'Mosky'}, {'first_name': 'Keith'}])
+            with assert_raises(ValueError):
+                gather(querysets[0], people, merge=True)
+
+    def test_gather_routing(self):
+        router = CountingRouter()
+        with override_settings(DATABASE_ROUTERS=[router]):
+            results = gather(Employee.objects.select(), max_workers=1)
+        eq_(len(results[0]), 2)
+        # The queryset is executed on, and disconnected from, one database.
+        eq_(router.reads, 1)
+
+    def test_async_write(self):
+        for db in settings.DATABASES:
+            manager = Employee.objects.db_manager(db)
+            eq_(manager.abulk_insert(
+                [{'first_name': 'John', 'last_name': 'Doe'}]
+            ).result(), 1)
+            people = manager.select().where({'last_name': 'Doe'})
+            eq_(people.aupdate({'first_name': 'Jane'}).result(), 1)
+            eq_(people.adelete().result(), 1)
+
+    def test_async_sharded(self):
+        manager = ShardedMoManager(
+            ['default', 'default'], 'department_id', lambda v: 'default'
+        )
+        manager.model = Employee
+        people = manager.select()
+        assert_is_none(people.db)
+        eq_(people.acount().result(), 4)
+        ok_(people.aexists().result())
+        assert_false(people.where({'id': 0}).aexists().result())
+        eq_(people.where({'department_id': 1}).acount().result(), 1)
+        with assert_raises(NotImplementedError):
+            people.explain()
+        with assert_raises(NotImplementedError):
+            people.copy_to(six.StringIO())
+        ok_(people.where({'department_id': 1}).explain())
+
+    @skipIf(six.PY2, 'asyncio is not available')
+    def test_async_await(self):
+        import asyncio
+
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        self.addCleanup(asyncio.set_event_loop, None)
+        self.addCleanup(loop.close)
+        for db in settings.DATABASES:
+            people = Employee.objects.db_manager(db).select().order_by('id')
+
+            eq_(loop.run_until_complete(people.acount()), 2)
+            names = []
+            iterator = people.aiter().__aiter__()
+            while True:
+                try:
+                    person = loop.run_until_complete(iterator.__anext__())
+                except StopAsyncIteration:  # noqa: F821
+                    break
+                names.append(person.first_name)
+            eq_(names, ['Mosky', 'Keith'])
+
+
 # These tests change states of the database, and therefore require database
 # refreshes between them.
 class EmployeeMoSQLMutableTests(TestCase):
@@ -231,6 +1086,92 @@ class EmployeeMoSQLMutableTests(TestCase):
             with assert_raises(Employee.DoesNotExist):
                 Employee.objects.db_manager(db).get(id=person_id)
 
+    def test_update_simple(self):
+        for db in settings.DATABASES:
+            people = Employee.objects.db_manager(db).select().where({
+                'first_name': 'Mosky'
+            })
+            with self.assertNumQueries(1, using=db):
+                eq_(people.update({'last_name': 'Lin'}), 1)
+            eq_(Employee.objects.db_manager(db).get(id=1).last_name, 'Lin')
+
+    def test_update_non_simple(self):
+        for db in settings.DATABASES:
+            people = (
+                Employee.objects.db_manager(db).select().as_('e')
+                        .order_by('-id')[:1]
+            )
+            with self.assertNumQueries(1, using=db):
+                eq_(people.update({'first_name': raw("'Kay'")}), 1)
+            eq_(list(Employee.objects.db_manager(db).order_by('id')
+                     .values_list('first_name', flat=True)), ['Mosky', 'Kay'])
+
+    def test_bulk_insert(self):
+        for db in settings.DATABASES:
+            manager = Employee.objects.db_manager(db)
+            rows = [
+                {'first_name': name, 'last_name': 'Doe', 'department': 1}
+                for name in ('John', 'Jane', 'Jim')
+            ]
+            with self.assertNumQueries(2, using=db):
+                eq_(manager.bulk_insert(rows, batch_size=2), 3)
+            eq_(manager.select().where({'department_id': 1}).count(), 4)
+
+            eq_(manager.bulk_insert([Employee(first_name='Kay')]), 1)
+            eq_(manager.select().where({'first_name': 'Kay'}).count(), 1)
+            eq_(manager.bulk_insert([]), 0)
+            with assert_raises(ValueError):
+                manager.bulk_insert(rows, on_conflict='replace')
+
+    def test_bulk_insert_on_conflict(self):
+        for db in settings.DATABASES:
+            manager = Employee.objects.db_manager(db)
+            manager.bulk_insert(
+                [Employee(id=1, first_name='Andy', last_name='Lin')],
+                on_conflict='ignore',
+            )
+            eq_(manager.get(id=1).first_name, 'Mosky')
+
+            manager.bulk_insert(
+                [{'id': 1, 'first_name': 'Andy', 'last_name': 'Lin'},
+                 {'id': 3, 'first_name': 'John', 'last_name': 'Doe'}],
+                on_conflict='update', conflict_fields=['id'],
+                update_fields=['first_name'],
+            )
+            eq_(list(manager.order_by('id').values_list(
+                'first_name', 'last_name'
+            )), [('Andy', 'Liu'), ('Keith', u'楊'), ('John', 'Doe')])
+
+            manager.bulk_insert(
+                [{'pk': 3, 'first_name': 'Jane', 'last_name': 'Doe'}],
+                on_conflict='update', conflict_fields=['pk'],
+            )
+            eq_(manager.get(pk=3).first_name, 'Jane')
+
+    def test_copy_from(self):
+        for db in settings.DATABASES:
+            manager = Employee.objects.db_manager(db)
+            source = six.StringIO('John,Doe,1\nJane,Doe,\n')
+            columns = ('first_name', 'last_name', 'department')
+            eq_(manager.copy_from(source, columns=columns), 2)
+            rows = [('Jim', 'Doe', None)] * 3
+            eq_(manager.copy_from(rows, columns=columns), 3)
+            eq_(list(manager.select().where({'last_name': 'Doe'}).order_by(
+                'id'
+            ).values_list('first_name', 'department')), [
+                ('John', 1), ('Jane', None),
+                ('Jim', None), ('Jim', None), ('Jim', None),
+            ])
+
+    def test_delete_batched(self):
+        for db in settings.DATABASES:
+            people = Employee.objects.db_manager(db).select().as_('e')
+            progress = []
+            with self.assertNumQueries(5, using=db):
+                eq_(people.delete(batch_size=1, callback=progress.append), 2)
+            eq_(progress, [1, 2])
+            eq_(people.count(), 0)
+
 
 # Tests in this class originates from
 # http://www.xaprb.com/blog/2006/12/07/how-to-select-the-firstleastmax-row-per-group-in-sql/
@@ -239,6 +1180,17 @@ class FruitMoSQLTests(TestCase):
     fixtures = ['fruits']
     multi_db = True
 
+    def test_delete_batched_limit(self):
+        for db in settings.DATABASES:
+            products = FruitProduct.objects.db_manager(db).select()
+            # Primary keys are selected once, and deleted in two batches.
+            with self.assertNumQueries(3, using=db):
+                eq_(products.order_by('-price')[:3].delete(batch_size=2), 3)
+            eq_(sorted(products.values_list('id', flat=True)),
+                [1, 2, 3, 4, 7, 8])
+            eq_(products.group_by('kind').delete(batch_size=2), 4)
+            eq_(sorted(products.values_list('id', flat=True)), [2, 3])
+
     def test_slice(self):
         all_products = FruitProduct.objects.select()
         eq_(all_products[1:].count(), 8)
@@ -252,6 +1204,158 @@ class FruitMoSQLTests(TestCase):
         with assert_raises(AssertionError):
             all_products[-1]
 
+    def test_index(self):
+        for db in settings.DATABASES:
+            products = FruitProduct.objects.db_manager(db).select().order_by(
+                'price'
+            )
+            eq_(products[0].variety, 'fuji')
+            eq_(products[8].variety, 'navel')
+            eq_(products[2:5][0].variety, 'bing')
+            eq_(products[2:5][1].variety, 'gala')
+            eq_(products[2:5][1:][1].variety, 'limbertwig')
+            eq_(products[2:2].count(), 0)
+            eq_(products[0:3][2:10].count(), 1)
+            with assert_raises(IndexError):
+                products[9]
+            with assert_raises(IndexError):
+                products[2:5][3]
+
+    def test_first_last(self):
+        for db in settings.DATABASES:
+            products = FruitProduct.objects.db_manager(db).select()
+            eq_(products.order_by('price').first().variety, 'fuji')
+            eq_(products.order_by('price').last().variety, 'navel')
+            eq_(products.order_by('-price').last().variety, 'fuji')
+            eq_(products.order_by('kind', 'price DESC').last().variety,
+                'bartlett')
+            eq_(products.order_by('price')[2:5].last().variety,
+                'limbertwig')
+            eq_(products.last().pk, 9)
+            eq_(products.as_('f').last().pk, 9)
+            assert_is_none(products.where({'kind': 'banana'}).first())
+            assert_is_none(products.where({'kind': 'banana'}).last())
+
+    def test_get(self):
+        for db in settings.DATABASES:
+            products = FruitProduct.objects.db_manager(db).select()
+            eq_(products.get({'variety': 'fuji'}).price, 0.24)
+            eq_(products.where({'kind': 'pear', 'price <': 3}).get().pk, 7)
+            with assert_raises(FruitProduct.DoesNotExist):
+                products.get({'kind': 'banana'})
+            with assert_raises(FruitProduct.MultipleObjectsReturned):
+                products.get({'kind': 'apple'})
+
+    def test_paginate_after(self):
+        for db in settings.DATABASES:
+            products = FruitProduct.objects.db_manager(db).select()
+
+            page = products.order_by('price').paginate_after(None, 3)
+            eq_([p.variety for p in page], ['fuji', 'bartlett', 'bing'])
+            page = products.order_by('price').paginate_after(page[2], 3)
+            eq_([p.variety for p in page], ['gala', 'limbertwig', 'valencia'])
+            page = products.order_by('price').paginate_after((2.79, 1), 2)
+            eq_([p.variety for p in page], ['limbertwig', 'valencia'])
+
+            ordered = products.as_('f').order_by('f.kind', '-f.price')
+            page = ordered.paginate_after(
+                {'kind': 'apple', 'price': 2.79, 'id': 1}
+            )
+            eq_([p.variety for p in page][:3], ['fuji', 'chelan', 'bing'])
+
+            with assert_raises(AssertionError):
+                products[:3].paginate_after(None, 3)
+            with assert_raises(ValueError):
+                products.order_by('price').paginate_after((2.79,), 3)
+
+    def test_keyset_paginator(self):
+        for db in settings.DATABASES:
+            products = FruitProduct.objects.db_manager(db).select().order_by(
+                'kind', 'variety'
+            )
+            paginator = KeysetPaginator(products, 4)
+            eq_(paginator.count, 9)
+            eq_(paginator.num_pages, 3)
+
+            page = paginator.page_after()
+            varieties = [p.variety for p in page]
+            assert_false(page.has_previous())
+            while page.has_next():
+                page = paginator.page_after(page.next_after)
+                ok_(page.has_previous())
+                varieties.extend(p.variety for p in page)
+            eq_(len(page), 1)
+            assert_is_none(page.next_after)
+            eq_(varieties, [p.variety for p in products])
+
+    def test_sharded(self):
+        # Both shards are the same database, so each row is selected twice
+        # when scattered.
+        manager = ShardedMoManager(
+            ['default', 'default'], 'kind', lambda kind: 'default'
+        )
+        manager.model = FruitProduct
+        apples = manager.select().where({'kind': 'apple'})
+        eq_(apples.db, 'default')
+        eq_(apples.count(), 3)
+
+        products = manager.select().order_by('price')
+        assert_is_none(products.db)
+        eq_(products.count(), 18)
+        eq_(products[1:4].count(), 3)
+        eq_(products[17:].count(), 1)
+        with assert_raises(NotImplementedError):
+            products.group_by('kind').count()
+        ok_(products.exists())
+        assert_false(products[18:].exists())
+        eq_([p.price for p in products[1:4]], [0.24, 2.14, 2.14])
+        eq_([p.variety for p in products.iterator(1)][:4],
+            ['fuji', 'fuji', 'bartlett', 'bartlett'])
+        rows = manager.select().order_by('-price').values('variety', 'price')
+        eq_([r['variety'] for r in rows[:3]], ['navel', 'navel', 'chelan'])
+        eq_(manager.db_manager('default').select().count(), 9)
+
+    def test_keyset_condition(self):
+        handler = EngineHandler(connections['default'], 'standard')
+        ordering = [('kind', False), ('id', False)]
+        eq_(handler.get_keyset_condition(ordering, ['pear', 1]),
+            '("kind", "id") > (\'pear\', 1)')
+        ordering = [('kind', True), ('id', False)]
+        eq_(handler.get_keyset_condition(ordering, ['pear', 1]),
+            '(("kind" < \'pear\') OR ("kind" = \'pear\' AND "id" > 1))')
+        eq_(handler.get_keyset_condition([('id', True)], [3]), '"id" < 3')
+
+    def test_count(self):
+        for db in settings.DATABASES:
+            products = (
+                FruitProduct.objects.db_manager(db)
+                            .select((Min('price'), 'minprice'))
+                            .as_('f')
+                            .group_by('f.kind')
+                            .order_by('minprice')
+            )
+            eq_(products.count(), 4)
+            eq_(products[1:].count(), 3)
+            eq_(products[1:3].count(), 2)
+            eq_(products[5:].count(), 0)
+
+    def test_count_query(self):
+        for db in settings.DATABASES:
+            products = (
+                FruitProduct.objects.db_manager(db)
+                            .select().where({'kind': 'apple'})
+                            .order_by('price')
+            )
+            handler = get_engine_handler(db)
+            expect = (
+                'SELECT COUNT(*) FROM (SELECT "{table}".* FROM "{table}"'
+                ' WHERE "kind" = \'apple\') AS "sub"'
+            ).format(table=FruitProduct._meta.db_table)
+            if db == 'mysql':
+                expect = expect.replace('"', '`')
+            eq_(handler.get_count_query(products), expect)
+            ok_('ORDER BY' in handler.get_count_query(products[:2]))
+
     def test_order_by(self):
         for db in settings.DATABASES:
             all_products = FruitProduct.objects.db_manager(db).select()
@@ -302,6 +1406,36 @@ class FruitMoSQLTests(TestCase):
             eq_((products[2].kind, products[2].minprice), ('orange', 3.59))
             eq_((products[3].kind, products[3].minprice), ('pear', 2.14))
 
+            expect = 'MIN("price") AS "minprice"'
+            if db == 'mysql':
+                expect = expect.replace('"', '`')
+            ok_(expect in products.query)
+            eq_(list(products.values_list('kind', Min('price'))[:1]),
+                [('apple', 0.24)])
+
+    def test_function_expressions(self):
+        for db in settings.DATABASES:
+            products = (
+                FruitProduct.objects.db_manager(db)
+                            .select((Min('price'), 'minprice'))
+                            .as_('f')
+                            .group_by(Upper('f.kind'))
+            )
+            eq_([p.minprice for p in products.order_by(Min('f.price'))],
+                [0.24, 2.14, 2.55, 3.59])
+            eq_([p.minprice
+                 for p in products.order_by(Min('f.price') + ' DESC')],
+                [3.59, 2.55, 2.14, 0.24])
+
+            joined = FruitProduct.objects.db_manager(db).select().as_(
+                'f'
+            ).join(FruitProduct, 'g', on={'f.variety': Upper('g.variety')})
+            expect = 'ON "f"."variety" = UPPER("g"."variety")'
+            if db == 'mysql':
+                expect = expect.replace('"', '`')
+            ok_(expect in joined.query)
+            eq_(joined.count(), 0)
+
     def test_as(self):
         for db in settings.DATABASES:
             products = FruitProduct.objects.db_manager(db).select().as_('f')